@@ -1,10 +1,17 @@
+import logging
 import os
-from typing import Any
+import threading
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Annotated, Any, AsyncIterator, Generator, Iterator, Literal, Mapping
 
 from importlib.metadata import PackageNotFoundError, version
 
-from fastapi import APIRouter, FastAPI, HTTPException, status, Request, Response
+from fastapi import APIRouter, Body, FastAPI, HTTPException, Query, status, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import TypeAdapter
+from starlette.types import Receive, Scope, Send
 
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
@@ -12,25 +19,73 @@ from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
 
 from controller import (
+    CompactFormat,
+    DatabaseUnavailableError,
+    FormattedRows,
     InvalidRequestError,
     NotFoundError,
+    fetch_all_competitions_by_ids,
     fetch_competition_by_id,
+    fetch_competitions_by_ids,
+    fetch_mean_rankings_by_person_ids,
+    fetch_persons_by_ids,
+    fetch_results_by_person_ids,
+    fetch_single_rankings_by_person_ids,
     fetch_countries,
+    fetch_export,
+    fetch_exports,
     fetch_continent_ids,
     fetch_mean_ranking_by_region,
-    fetch_mean_ranking_for_person,
+    fetch_mean_ranking_json_for_person,
     fetch_metadata,
     fetch_person_by_id,
-    fetch_record_mean_history_by_region,
+    fetch_persons_matching_query,
     fetch_single_ranking_by_region,
-    fetch_single_ranking_for_person,
-    fetch_record_single_history_by_region,
-    fetch_results_by_competition_id,
-    fetch_results_by_person_id,
+    fetch_single_ranking_json_for_person,
     fetch_round_types,
     fetch_competitions_matching_query,
+    fetch_formatted_ranking_by_region,
+    fetch_formatted_rankings_after,
+    fetch_formatted_record_mean_history_by_region,
+    fetch_formatted_record_single_history_by_region,
+    fetch_formatted_results_by_competition_id,
+    fetch_formatted_results_by_person_id,
+    fetch_generation,
+    fetch_generation_and_published_at,
+    fetch_lookup_cache_stats,
+    fetch_open_generation,
+    fetch_ranking_by_region,
+    fetch_ranking_count,
+    fetch_rankings_after,
+    fetch_region_ids,
+    check_database_health,
+    query_executor,
+    stream_record_mean_history_json_by_region,
+    stream_record_single_history_json_by_region,
+    stream_results_json_by_competition_id,
+    stream_results_json_by_person_id,
+    warm_lookup_caches,
 )
-from schema import Competition, Country, ErrorMessage, Person, Ranking, Result, RoundType, Metadata
+from caching import GenerationCacheMiddleware, etag_matches
+from compression import CompressionMiddleware
+import rate_limit_storage  # noqa: F401  Registers the sqlite:// storage scheme with the limiter.
+from ranking_pages import RankingKind, RankingPages
+from schema import (
+    BatchItem,
+    Competition,
+    Country,
+    ErrorMessage,
+    ExportFile,
+    Health,
+    Person,
+    Ranking,
+    Result,
+    RoundType,
+    Metadata,
+)
+
+
+_logger = logging.getLogger(__name__)
 
 
 description = """
@@ -43,6 +98,23 @@ API_BASE_ROUTE = "/api/v2"
 
 BAD_REQUEST: dict[int | str, dict[str, Any]] = {400: {"model": ErrorMessage}}
 NOT_FOUND: dict[int | str, dict[str, Any]] = {404: {"model": ErrorMessage}}
+UNAVAILABLE: dict[int | str, dict[str, Any]] = {503: {"model": ErrorMessage}}
+
+
+# Cache-Control by path prefix. Everything below only changes when the ETL publishes a new generation, so clients can
+# revalidate cheaply with the ETag; lists that rarely change at all may be reused for longer without asking.
+CACHE_CONTROL = {
+    f"{API_BASE_ROUTE}/countries": "public, max-age=86400",
+    f"{API_BASE_ROUTE}/continents": "public, max-age=86400",
+    f"{API_BASE_ROUTE}/competition/roundtypes": "public, max-age=86400",
+    f"{API_BASE_ROUTE}/competition": "public, max-age=3600",
+    f"{API_BASE_ROUTE}/person": "public, max-age=300",
+    f"{API_BASE_ROUTE}/ranking": "public, max-age=300",
+    f"{API_BASE_ROUTE}/records": "public, max-age=300",
+    f"{API_BASE_ROUTE}/metadata": "public, max-age=300",
+    f"{API_BASE_ROUTE}/export": "public, max-age=300",
+    f"{API_BASE_ROUTE}/health": "no-store",
+}
 
 
 api_version = os.environ.get("API_VERSION")
@@ -53,6 +125,57 @@ if not api_version:
         api_version = "0.0.0"
 
 
+# Bounds for the page size of rankings paged with a cursor.
+DEFAULT_RANKING_LIMIT = 100
+MAX_RANKING_LIMIT = 1000
+
+
+# The most IDs a batch request may ask for.
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "100"))
+
+BatchIds = Annotated[list[str], Body(min_length=1, max_length=MAX_BATCH_SIZE)]
+
+
+# Lists of results and rankings can be sent as JSON objects (the route's schema) or in a compact format.
+Format = Literal["json", CompactFormat]
+
+ResponseFormat = Annotated[
+    Format,
+    Query(
+        description="`json` for an array of objects, `columnar` for a JSON object with an array per field, `arrow` for "
+        "an Arrow IPC stream, or `parquet` for a Parquet file."
+    ),
+]
+
+
+# Bounds for the number of search results.
+DEFAULT_SEARCH_LIMIT = 100
+MAX_SEARCH_LIMIT = 1000
+
+
+# How many pages of single and mean rankings per region are served from JSON rendered once per ETL generation.
+PRECOMPUTED_RANKING_PAGES = int(os.getenv("PRECOMPUTED_RANKING_PAGES", "3"))
+
+ranking_pages = RankingPages(
+    PRECOMPUTED_RANKING_PAGES,
+    generation=fetch_generation,
+    regions=fetch_region_ids,
+    fetch=fetch_ranking_by_region,
+)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    try:
+        warm_lookup_caches()
+        ranking_pages.warm()
+    except DatabaseUnavailableError:
+        _logger.exception("Could not warm caches at startup")
+    yield
+    ranking_pages.close()
+    query_executor.close()
+
+
 app = FastAPI(
     title="Multi-Blind Alternative Ranking API",
     description=description,
@@ -60,11 +183,39 @@ app = FastAPI(
     openapi_url=f"{API_BASE_ROUTE}/openapi.json",
     redoc_url=f"{API_BASE_ROUTE}/docs",
     license_info={"name": "MIT", "url": "https://opensource.org/license/mit/"},
+    lifespan=lifespan,
 )
 
-limiter = Limiter(key_func=get_remote_address, application_limits=["50/15 seconds"], headers_enabled=True)
+# Requests per client address. With several worker processes, the limiter's storage must be shared between them (for
+# example `sqlite:////tmp/rate-limits.sqlite`) or each worker counts separately.
+RATE_LIMIT = os.getenv("RATE_LIMIT", "50/15 seconds")
+RATE_LIMIT_STORAGE_URI = os.getenv("RATE_LIMIT_STORAGE_URI", "memory://")
+
+limiter = Limiter(
+    key_func=get_remote_address,
+    application_limits=[RATE_LIMIT],
+    headers_enabled=True,
+    storage_uri=RATE_LIMIT_STORAGE_URI,
+)
 app.state.limiter = limiter
 
+async def current_generation() -> tuple[str, datetime | None]:
+    """
+    The generation being served and when it was published. Checking that the open build is still current is only a
+    stat of the file; opening the build that replaced it runs on the query executor, off the event loop.
+    """
+    return fetch_open_generation() or await query_executor.run(fetch_generation_and_published_at)
+
+
+app.add_middleware(
+    GenerationCacheMiddleware,
+    generation=current_generation,
+    cache_control=CACHE_CONTROL,
+)
+
+# Outside the caching middleware, so that it sees (and weakens) the ETag of what it compresses.
+app.add_middleware(CompressionMiddleware)
+
 app.add_middleware(SlowAPIMiddleware)
 
 app.add_middleware(
@@ -73,11 +224,90 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Next-Cursor", "X-Search-Complete"],
 )
 
 router = APIRouter(prefix=API_BASE_ROUTE)
 
 
+_COMPETITION_BATCH = TypeAdapter(BatchItem[Competition])
+_PERSON_BATCH = TypeAdapter(BatchItem[Person])
+_RESULTS_BATCH = TypeAdapter(BatchItem[list[Result]])
+_RANKINGS_BATCH = TypeAdapter(BatchItem[list[Ranking]])
+
+
+def _batch_response(ids: list[str], found: Mapping[str, Any], adapter: TypeAdapter) -> StreamingResponse:
+    """A JSON array with an item per ID, written out one item at a time rather than rendered as a whole."""
+
+    def items() -> Iterator[bytes]:
+        yield b"["
+        for i, id in enumerate(ids):
+            if id in found:
+                item = BatchItem(id=id, status="ok", data=found[id])
+            else:
+                item = BatchItem(id=id, status="not_found")
+            yield (b"," if i else b"") + adapter.dump_json(item)
+        yield b"]"
+
+    return StreamingResponse(items(), media_type="application/json")
+
+
+def _json_response(body: bytes) -> Response:
+    # Already rendered by the database; the route's return annotation still documents its schema.
+    return Response(content=body, media_type="application/json")
+
+
+def _formatted_response(rows: FormattedRows) -> Response:
+    return Response(content=rows.body, media_type=rows.media_type)
+
+
+class _JsonStreamResponse(StreamingResponse):
+    """
+    JSON rendered by the database, sent a chunk at a time as it is rendered. The route's return annotation still
+    documents its schema.
+
+    Each chunk after the first is fetched through the query executor too, so a long response counts against its
+    concurrency limit and every chunk against QUERY_TIMEOUT. A chunk that is refused or times out ends the response
+    early, since its status has already been sent.
+
+    The chunks hold a database cursor until they are exhausted or closed. If the client goes away mid-response the
+    response is cancelled, and the chunks are closed here rather than whenever they are garbage collected.
+    """
+
+    def __init__(self, chunks: Generator[bytes, None, None]) -> None:
+        super().__init__(self._fetch(), media_type="application/json")
+        self._chunks = chunks
+        # Held while a chunk is rendered, since the chunks cannot be closed in the middle of one.
+        self._rendering = threading.Lock()
+        self._closed = False
+
+    async def _fetch(self) -> AsyncIterator[bytes]:
+        while (chunk := await query_executor.run(self._next_chunk)) is not None:
+            yield chunk
+
+    def _next_chunk(self) -> bytes | None:
+        with self._rendering:
+            chunk = None if self._closed else next(self._chunks, None)
+        if self._closed:
+            self._close()
+        return chunk
+
+    def _close(self) -> None:
+        self._closed = True
+        # Never waits on the event loop: if a chunk is being rendered, the thread rendering it closes the chunks.
+        if self._rendering.acquire(blocking=False):
+            try:
+                self._chunks.close()
+            finally:
+                self._rendering.release()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._close()
+
+
 @app.exception_handler(NotFoundError)
 async def not_found_exception_handler(_, exc: NotFoundError):
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(exc))
@@ -88,17 +318,24 @@ async def invalid_request(_, exc: InvalidRequestError):
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
 
 
+@app.exception_handler(DatabaseUnavailableError)
+async def database_unavailable(_, exc: DatabaseUnavailableError):
+    raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(exc))
+
+
 @app.exception_handler(RateLimitExceeded)
 async def rate_limited(request: Request, exc: RateLimitExceeded):
     return _rate_limit_exceeded_handler(request, exc)
 
 
 @router.get("/person/results/{wca_id}", tags=["People"], responses={**NOT_FOUND})
-async def get_results_for_person(wca_id: str) -> list[Result]:
+async def get_results_for_person(wca_id: str, format: ResponseFormat = "json") -> list[Result]:
     """
     Get results for a person by WCA ID.
     """
-    return fetch_results_by_person_id(wca_id)
+    if format != "json":
+        return _formatted_response(await query_executor.run(fetch_formatted_results_by_person_id, wca_id, format))
+    return _JsonStreamResponse(await query_executor.run(stream_results_json_by_person_id, wca_id))
 
 
 @router.get("/person/ranking/single/{wca_id}", tags=["People"], responses={**NOT_FOUND})
@@ -106,7 +343,7 @@ async def get_ranking_for_person(wca_id: str) -> list[Ranking]:
     """
     Get the ranks and best results for a person by WCA ID.
     """
-    return fetch_single_ranking_for_person(wca_id)
+    return _json_response(await query_executor.run(fetch_single_ranking_json_for_person, wca_id))
 
 
 @router.get("/person/ranking/mean/{wca_id}", tags=["People"], responses={**NOT_FOUND})
@@ -114,7 +351,63 @@ async def get_mean_ranking_for_person(wca_id: str) -> list[Ranking]:
     """
     Get the mean ranks and best results for a person by WCA ID.
     """
-    return fetch_mean_ranking_for_person(wca_id)
+    return _json_response(await query_executor.run(fetch_mean_ranking_json_for_person, wca_id))
+
+
+@router.post("/person/batch", tags=["People"], response_model=list[BatchItem[Person]])
+async def get_persons_batch(wca_ids: BatchIds) -> StreamingResponse:
+    """
+    Get up to `MAX_BATCH_SIZE` people by WCA ID, with a status for each ID.
+    """
+    wca_ids = list(dict.fromkeys(wca_ids))
+    return _batch_response(wca_ids, await query_executor.run(fetch_persons_by_ids, wca_ids), _PERSON_BATCH)
+
+
+@router.post("/person/results/batch", tags=["People"], response_model=list[BatchItem[list[Result]]])
+async def get_results_for_persons_batch(wca_ids: BatchIds) -> StreamingResponse:
+    """
+    Get the results of up to `MAX_BATCH_SIZE` people by WCA ID, with a status for each ID.
+    """
+    wca_ids = list(dict.fromkeys(wca_ids))
+    return _batch_response(wca_ids, await query_executor.run(fetch_results_by_person_ids, wca_ids), _RESULTS_BATCH)
+
+
+@router.post("/person/ranking/single/batch", tags=["People"], response_model=list[BatchItem[list[Ranking]]])
+async def get_rankings_for_persons_batch(wca_ids: BatchIds) -> StreamingResponse:
+    """
+    Get the ranks and best results of up to `MAX_BATCH_SIZE` people by WCA ID, with a status for each ID.
+    """
+    wca_ids = list(dict.fromkeys(wca_ids))
+    rankings = await query_executor.run(fetch_single_rankings_by_person_ids, wca_ids)
+    return _batch_response(wca_ids, rankings, _RANKINGS_BATCH)
+
+
+@router.post("/person/ranking/mean/batch", tags=["People"], response_model=list[BatchItem[list[Ranking]]])
+async def get_mean_rankings_for_persons_batch(wca_ids: BatchIds) -> StreamingResponse:
+    """
+    Get the mean ranks and best results of up to `MAX_BATCH_SIZE` people by WCA ID, with a status for each ID.
+    """
+    wca_ids = list(dict.fromkeys(wca_ids))
+    rankings = await query_executor.run(fetch_mean_rankings_by_person_ids, wca_ids)
+    return _batch_response(wca_ids, rankings, _RANKINGS_BATCH)
+
+
+@router.get("/person/search", tags=["People"], responses={**BAD_REQUEST})
+async def search_persons(
+    query: str,
+    response: Response,
+    page: Annotated[int, Query(ge=1)] = 1,
+    limit: Annotated[int, Query(ge=1, le=MAX_SEARCH_LIMIT)] = DEFAULT_SEARCH_LIMIT,
+) -> list[Person]:
+    """
+    Search for people with Multi-Blind results by name or WCA ID, ignoring case and accents. The query must be at
+    least 2 characters long. Results are paged by `page` and `limit`, best matches first. If the search ran out of
+    time, the `X-Search-Complete` header is `false` and some better matches may be missing.
+    """
+    results = await query_executor.run(fetch_persons_matching_query, query, page, limit)
+    if not results.complete:
+        response.headers["X-Search-Complete"] = "false"
+    return results.persons
 
 
 @router.get("/person/{wca_id}", tags=["People"], responses={**NOT_FOUND})
@@ -122,15 +415,18 @@ async def get_person(wca_id: str) -> Person:
     """
     Get person by WCA ID.
     """
-    return fetch_person_by_id(wca_id)
+    return await query_executor.run(fetch_person_by_id, wca_id)
 
 
 @router.get("/competition/results/{competition_id}", tags=["Competitions"], responses={**NOT_FOUND})
-async def get_results_for_competition(competition_id: str) -> list[Result]:
+async def get_results_for_competition(competition_id: str, format: ResponseFormat = "json") -> list[Result]:
     """
     Get results for a competition by competition ID.
     """
-    return fetch_results_by_competition_id(competition_id)
+    if format != "json":
+        results = await query_executor.run(fetch_formatted_results_by_competition_id, competition_id, format)
+        return _formatted_response(results)
+    return _JsonStreamResponse(await query_executor.run(stream_results_json_by_competition_id, competition_id))
 
 
 @router.get("/competition/roundtypes", tags=["Competitions"])
@@ -138,23 +434,37 @@ async def get_round_types(request: Request, response: Response) -> list[RoundTyp
     """
     Get available round types.
     """
-    return fetch_round_types()
+    return await query_executor.run(fetch_round_types)
 
 
-@router.post("/competition/details", tags=["Competitions"])
+@router.post("/competition/details", tags=["Competitions"], responses={**NOT_FOUND})
 async def get_batch_competition_details(competition_ids: list[str]) -> list[Competition]:
     """
-    Get details for multiple competitions for a list of  competition IDs.
+    Get details for multiple competitions for a list of  competition IDs. Fails if any of them is not found; see
+    `/competition/batch` for partial results.
+    """
+    return await query_executor.run(fetch_all_competitions_by_ids, competition_ids)
+
+
+@router.post("/competition/batch", tags=["Competitions"], response_model=list[BatchItem[Competition]])
+async def get_competitions_batch(competition_ids: BatchIds) -> StreamingResponse:
+    """
+    Get up to `MAX_BATCH_SIZE` competitions by ID, with a status for each ID.
     """
-    return [fetch_competition_by_id(competition_id) for competition_id in competition_ids]
+    competition_ids = list(dict.fromkeys(competition_ids))
+    competitions = await query_executor.run(fetch_competitions_by_ids, competition_ids)
+    return _batch_response(competition_ids, competitions, _COMPETITION_BATCH)
 
 
 @router.post("/competition/search", tags=["Competitions"], responses={**BAD_REQUEST})
-async def search_competitions(query: str) -> list[Competition]:
+async def search_competitions(
+    query: str, limit: Annotated[int, Query(ge=1, le=MAX_SEARCH_LIMIT)] = DEFAULT_SEARCH_LIMIT
+) -> list[Competition]:
     """
-    Search for competitions by name, ID, or country. The query must be at least 3 characters long.
+    Search for competitions by name, ID, or country, ignoring case and accents. The query must be at least 3 characters
+    long. Up to `limit` competitions are returned, best matches first.
     """
-    return fetch_competitions_matching_query(query)
+    return await query_executor.run(fetch_competitions_matching_query, query, limit)
 
 
 @router.get("/competition/{competition_id}", tags=["Competitions"], responses={**NOT_FOUND})
@@ -162,7 +472,7 @@ async def get_competition(competition_id: str) -> Competition:
     """
     Get competition by ID.
     """
-    return fetch_competition_by_id(competition_id)
+    return await query_executor.run(fetch_competition_by_id, competition_id)
 
 
 @router.get("/countries", tags=["Regions"])
@@ -170,7 +480,7 @@ async def get_countries(request: Request, response: Response) -> list[Country]:
     """
     Get all countries.
     """
-    return fetch_countries()
+    return await query_executor.run(fetch_countries)
 
 
 @router.get("/continents", tags=["Regions"])
@@ -178,55 +488,169 @@ async def get_continents(request: Request, response: Response) -> list[str]:
     """
     Get all continents.
     """
-    return fetch_continent_ids()
-
-
-@router.get("/ranking/single/{region}", tags=["Rankings"], responses={**NOT_FOUND})
-async def get_ranking_for_region(region: str) -> list[Ranking]:
-    """
-    Get the top 100 rankings for a region. The region can be 'world' or a continent or country ID.
-    """
-    return fetch_single_ranking_by_region(region)
+    return await query_executor.run(fetch_continent_ids)
+
+
+def _rankings_for_region(
+    request: Request,
+    response: Response,
+    kind: RankingKind,
+    region: str,
+    cursor: str | None,
+    limit: int | None,
+    format: Format,
+) -> list[Ranking] | Response:
+    total = str(fetch_ranking_count(region, kind))
+    if cursor is None and limit is None:
+        if format != "json":
+            formatted = _formatted_response(fetch_formatted_ranking_by_region(region, kind, 1, format))
+            formatted.headers["X-Total-Count"] = total
+            return formatted
+        precomputed = ranking_pages.response(request, fetch_generation(), kind, region, 1)
+        if precomputed is not None:
+            precomputed.headers["X-Total-Count"] = total
+            return precomputed
+        response.headers["X-Total-Count"] = total
+        return fetch_ranking_by_region(region, kind)
+
+    if format != "json":
+        formatted_page = fetch_formatted_rankings_after(region, kind, limit or DEFAULT_RANKING_LIMIT, cursor, format)
+        page_response = _formatted_response(formatted_page.rankings)
+        page_response.headers["X-Total-Count"] = total
+        if formatted_page.next_cursor is not None:
+            page_response.headers["X-Next-Cursor"] = formatted_page.next_cursor
+        return page_response
+
+    page = fetch_rankings_after(region, kind, limit or DEFAULT_RANKING_LIMIT, cursor)
+    response.headers["X-Total-Count"] = total
+    if page.next_cursor is not None:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    return page.rankings
+
+
+@router.get("/ranking/single/{region}", tags=["Rankings"], responses={**NOT_FOUND, **BAD_REQUEST})
+async def get_ranking_for_region(
+    region: str,
+    request: Request,
+    response: Response,
+    cursor: str | None = None,
+    limit: Annotated[int | None, Query(ge=1, le=MAX_RANKING_LIMIT)] = None,
+    format: ResponseFormat = "json",
+) -> list[Ranking]:
+    """
+    Get rankings for a region. The region can be 'world' or a continent or country ID.
+
+    Without `cursor` or `limit`, this is the top 100. Otherwise it is up to `limit` rankings after `cursor`; the cursor
+    for the next page is returned in the `X-Next-Cursor` header, which is absent on the last page. The number of
+    ranked persons in the region is returned in the `X-Total-Count` header.
+    """
+    return await query_executor.run(
+        _rankings_for_region, request, response, "single", region, cursor, limit, format
+    )
 
 
 @router.get("/ranking/single/{region}/{page}", tags=["Rankings"], responses={**NOT_FOUND})
-async def get_ranking_for_region_for_page(region: str, page: int) -> list[Ranking]:
+async def get_ranking_for_region_for_page(
+    region: str, page: int, request: Request, format: ResponseFormat = "json"
+) -> list[Ranking]:
     """
     Get paged rankings for a region. The region can be 'world' or a continent or country ID.
     """
-    return fetch_single_ranking_by_region(region, page)
+    if format != "json":
+        rankings = await query_executor.run(fetch_formatted_ranking_by_region, region, "single", page, format)
+        return _formatted_response(rankings)
+    generation, _ = await current_generation()
+    precomputed = ranking_pages.response(request, generation, "single", region, page)
+    return precomputed or await query_executor.run(fetch_single_ranking_by_region, region, page)
 
 
-@router.get("/ranking/mean/{region}", tags=["Rankings"], responses={**NOT_FOUND})
-async def get_mean_rankings_for_region(region: str) -> list[Ranking]:
+@router.get("/ranking/mean/{region}", tags=["Rankings"], responses={**NOT_FOUND, **BAD_REQUEST})
+async def get_mean_rankings_for_region(
+    region: str,
+    request: Request,
+    response: Response,
+    cursor: str | None = None,
+    limit: Annotated[int | None, Query(ge=1, le=MAX_RANKING_LIMIT)] = None,
+    format: ResponseFormat = "json",
+) -> list[Ranking]:
     """
     Get the mean rankings for a region. The region can be 'world' or a continent or country ID.
+
+    Paged the same way as the single rankings, with `cursor` and `limit`.
     """
-    return fetch_mean_ranking_by_region(region)
+    return await query_executor.run(
+        _rankings_for_region, request, response, "mean", region, cursor, limit, format
+    )
 
 
 @router.get("/ranking/mean/{region}/{page}", tags=["Rankings"], responses={**NOT_FOUND})
-async def get_mean_rankings_for_region_for_page(region: str, page: int) -> list[Ranking]:
+async def get_mean_rankings_for_region_for_page(
+    region: str, page: int, request: Request, format: ResponseFormat = "json"
+) -> list[Ranking]:
     """
     Get paged mean rankings for a region. The region can be 'world' or a continent or country ID.
     """
-    return fetch_mean_ranking_by_region(region, page)
+    if format != "json":
+        rankings = await query_executor.run(fetch_formatted_ranking_by_region, region, "mean", page, format)
+        return _formatted_response(rankings)
+    generation, _ = await current_generation()
+    precomputed = ranking_pages.response(request, generation, "mean", region, page)
+    return precomputed or await query_executor.run(fetch_mean_ranking_by_region, region, page)
 
 
 @router.get("/records/history/single/{region}", tags=["Records"], responses={**NOT_FOUND})
-async def get_records_history(region: str) -> list[Result]:
+async def get_records_history(region: str, format: ResponseFormat = "json") -> list[Result]:
     """
     Get the record history for a region. The region can be 'world' or a continent or country ID.
     """
-    return fetch_record_single_history_by_region(region)
+    if format != "json":
+        history = await query_executor.run(fetch_formatted_record_single_history_by_region, region, format)
+        return _formatted_response(history)
+    return _JsonStreamResponse(await query_executor.run(stream_record_single_history_json_by_region, region))
 
 
 @router.get("/records/history/mean/{region}", tags=["Records"], responses={**NOT_FOUND})
-async def get_mean_records_history(region: str) -> list[Result]:
+async def get_mean_records_history(region: str, format: ResponseFormat = "json") -> list[Result]:
     """
     Get the mean record history for a region. The region can be 'world' or a continent or country ID.
     """
-    return fetch_record_mean_history_by_region(region)
+    if format != "json":
+        history = await query_executor.run(fetch_formatted_record_mean_history_by_region, region, format)
+        return _formatted_response(history)
+    return _JsonStreamResponse(await query_executor.run(stream_record_mean_history_json_by_region, region))
+
+
+@router.get("/export", tags=["Export"])
+@limiter.exempt
+async def get_exports() -> list[ExportFile]:
+    """
+    List the bulk exports of the full rankings, mean rankings and results, rebuilt by every ETL run.
+    """
+    generation, _ = await current_generation()
+    return fetch_exports(generation)
+
+
+@router.api_route(
+    "/export/{name}", methods=["GET", "HEAD"], tags=["Export"], response_class=FileResponse, responses={**NOT_FOUND}
+)
+@limiter.exempt
+async def get_export(name: str, request: Request) -> Response:
+    """
+    Download a bulk export, as Parquet or gzipped CSV. Exports are files written by the ETL, so they are not rate
+    limited, and support `Range` requests for resuming a download.
+    """
+    generation, _ = await current_generation()
+    export = fetch_export(name, generation)
+    # The file only changes with the generation. The route sets its own ETag, which the caching middleware keeps.
+    etag = f'"{export.generation}-{name}"'
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return FileResponse(
+        export.path,
+        media_type=export.media_type,
+        filename=f"{export.generation}-{name}",
+        headers={"ETag": etag},
+    )
 
 
 @router.get("/metadata", tags=["Metadata"])
@@ -234,7 +658,19 @@ async def get_metadata() -> Metadata:
     """
     Get metadata, including the last updated date of the database.
     """
-    return fetch_metadata()
+    return await query_executor.run(fetch_metadata)
+
+
+@router.get("/health", tags=["Metadata"], responses={**UNAVAILABLE})
+async def get_health() -> Health:
+    """
+    Check that the database can be queried, and report the generation of the ETL build being served along with lookup
+    cache statistics.
+    """
+    generation = await query_executor.run(check_database_health)
+    return Health(
+        status="ok", generation=generation, caches=fetch_lookup_cache_stats(), queries=query_executor.stats()
+    )
 
 
 app.include_router(router)
@@ -0,0 +1,256 @@
+"""
+Benchmarks for the API, so changes to it can be measured without deploying it.
+
+    python benchmark.py [serialization|streaming|workers] [--rows 100000] [--workers 1 2 4] [--seconds 10]
+
+The serialization and streaming benchmarks run on synthetic data. The workers benchmark load tests uvicorn with each
+number of worker processes against the ETL build at DUCKDB_FILE, with the rate limiter counting in a shared SQLite file.
+"""
+
+import argparse
+import http.client
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Iterator
+
+import duckdb
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+
+# A results table with the columns and types the ETL writes, one row per number in range(rows).
+_CREATE_RESULTS = """
+    CREATE TABLE results AS
+    SELECT
+        'Comp' || (i % 5000) AS competition_id,
+        'Person ' || (i % 20000) AS person_name,
+        '2010PERS' || lpad(CAST(i % 20000 AS VARCHAR), 4, '0') AS person_id,
+        'C' || (i % 200) AS person_country_id,
+        CASE WHEN i % 20 = 0 THEN 'NR' ELSE '' END AS wca_record,
+        (i % 997) / 10 AS best_score,
+        (i % 991) / 10 AS mean_score,
+        600000000 + i % 390000000 AS best_result,
+        '_Europe' AS continent_id,
+        TIMESTAMP '2005-01-01' + INTERVAL (i % 7000) DAY AS startdate,
+        '' AS regional_record,
+        '' AS regional_mean_record,
+        600000000 + i % 390000000 AS value1,
+        600000000 + i % 380000000 AS value2,
+        CAST(0 AS BIGINT) AS value3,
+        (i % 997) / 10 AS score1,
+        (i % 983) / 10 AS score2,
+        CAST(0 AS DOUBLE) AS score3,
+        'f' AS round_type_id,
+        i % 50 + 1 AS wca_pos,
+        i % 50 + 1 AS pos
+    FROM range(?) AS t(i)
+"""
+
+_SELECT_RESULTS = "SELECT * FROM results LIMIT ?"
+
+
+@contextmanager
+def _synthetic_controller(rows: int) -> Iterator[ModuleType]:
+    """The controller module, reading a database of `rows` synthetic results."""
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "benchmark.duckdb")
+        with duckdb.connect(database) as conn:
+            conn.execute(_CREATE_RESULTS, (rows,))
+
+        # The controller opens DUCKDB_FILE when it is imported.
+        os.environ["DUCKDB_FILE"] = database
+        import controller
+
+        try:
+            yield controller
+        finally:
+            controller.pool.close()
+
+
+def _limits(rows: int) -> list[int]:
+    return [limit for limit in (100, 1_000, 10_000) if limit < rows] + [rows]
+
+
+def benchmark_serialization(controller: ModuleType, rows: int, repeats: int = 5) -> None:
+    """
+    Rendering a list of results to JSON through a dataclass per row and Pydantic, as FastAPI does for a route returning
+    list[Result], against having DuckDB render each row.
+    """
+    from schema import Result
+
+    adapter = TypeAdapter(list[Result])
+    renderers = {
+        "dataclasses": lambda limit: JSONResponse(
+            adapter.dump_python(controller._fetch_structured_data(_SELECT_RESULTS, Result, (limit,)), mode="json")
+        ).body,
+        "duckdb json": lambda limit: controller._fetch_json(_SELECT_RESULTS, Result, (limit,)),
+    }
+
+    print(f"serialization: best of {repeats}")
+    for limit in _limits(rows):
+        bodies = set()
+        timings = []
+        for name, render in renderers.items():
+            best = float("inf")
+            for _ in range(repeats):
+                start = time.perf_counter()
+                body = render(limit)
+                best = min(best, time.perf_counter() - start)
+            bodies.add(bytes(body))
+            timings.append(f"{name} {best * 1000:.1f}ms")
+        same = "same bytes" if len(bodies) == 1 else "DIFFERENT bytes"
+        print(f"  {limit:>7} results: {', '.join(timings)} ({same})")
+
+
+def benchmark_streaming(controller: ModuleType, rows: int) -> None:
+    """
+    Time to the first chunk, and peak Python memory, for results rendered whole against results streamed a chunk of
+    JSON_STREAM_ROWS at a time. The memory is what tracemalloc sees, so leaves out DuckDB's own buffers.
+    """
+    from schema import Result
+
+    print(f"streaming: chunks of {controller.JSON_STREAM_ROWS} results")
+    for limit in _limits(rows):
+        timings = []
+        for name, stream in (
+            ("whole", lambda: iter([controller._fetch_json(_SELECT_RESULTS, Result, (limit,))])),
+            ("streamed", lambda: controller._stream_json(_SELECT_RESULTS, Result, (limit,))),
+        ):
+            tracemalloc.start()
+            start = time.perf_counter()
+            chunks = stream()
+            next(chunks)
+            first = time.perf_counter() - start
+            for _ in chunks:
+                pass
+            peak = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+            timings.append(f"{name} first chunk {first * 1000:.1f}ms, peak {peak:.1f} MiB")
+        print(f"  {limit:>7} results: {'; '.join(timings)}")
+
+
+def _request_paths(database: str) -> list[str]:
+    """A mix of routes that query the database on every request: not precomputed, not cached."""
+    with duckdb.connect(database, read_only=True) as conn:
+        person_ids = [row[0] for row in conn.execute("SELECT DISTINCT person_id FROM results LIMIT 50").fetchall()]
+        competition_ids = [
+            row[0] for row in conn.execute("SELECT DISTINCT competition_id FROM results LIMIT 50").fetchall()
+        ]
+    paths = []
+    for person_id, competition_id in zip(person_ids, competition_ids):
+        paths.append(f"/api/v2/person/results/{person_id}")
+        paths.append(f"/api/v2/person/ranking/single/{person_id}")
+        paths.append(f"/api/v2/competition/results/{competition_id}")
+    paths.append("/api/v2/ranking/single/world/5")
+    return paths
+
+
+def _client(port: int, paths: list[str], seconds: float, counts: "multiprocessing.Queue[tuple[int, int]]") -> None:
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    ok = failed = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        connection.request("GET", paths[(ok + failed) % len(paths)])
+        response = connection.getresponse()
+        response.read()
+        if response.status == 200:
+            ok += 1
+        else:
+            failed += 1
+    connection.close()
+    counts.put((ok, failed))
+
+
+def _wait_until_up(port: int, server: subprocess.Popen, timeout: float = 120) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("The API exited while starting")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", "/api/v2/health")
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("The API did not start in time")
+
+
+def benchmark_workers(database: str | None, worker_counts: list[int], seconds: float, port: int = 8765) -> None:
+    """
+    Requests per second served by uvicorn with each number of worker processes, under as many concurrent clients as
+    keep the workers busy. Each worker opens the file read-only and warms its own caches; the rate limiter is set high
+    enough not to reject anything, but still counts every request in the shared store.
+    """
+    if not database or not os.path.exists(database):
+        raise SystemExit("The workers benchmark needs DUCKDB_FILE to point to an ETL build")
+    paths = _request_paths(database)
+
+    print(f"workers: {os.cpu_count()} cores, {len(paths)} paths, {seconds:g}s per run")
+    baseline = None
+    for workers in worker_counts:
+        with tempfile.TemporaryDirectory() as directory:
+            env = {
+                **os.environ,
+                "DUCKDB_FILE": os.path.abspath(database),
+                "RATE_LIMIT": "1000000/second",
+                "RATE_LIMIT_STORAGE_URI": f"sqlite:///{os.path.join(directory, 'rate-limits.sqlite')}",
+            }
+            server = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "api:app", "--port", str(port), "--workers", str(workers)],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            try:
+                _wait_until_up(port, server)
+                counts: multiprocessing.Queue[tuple[int, int]] = multiprocessing.Queue()
+                clients = [
+                    multiprocessing.Process(target=_client, args=(port, paths, seconds, counts))
+                    for _ in range(2 * workers)
+                ]
+                for client in clients:
+                    client.start()
+                results = [counts.get() for _ in clients]
+                for client in clients:
+                    client.join()
+            finally:
+                server.terminate()
+                server.wait()
+
+        ok = sum(result[0] for result in results)
+        failed = sum(result[1] for result in results)
+        rate = ok / seconds
+        baseline = baseline or rate
+        print(f"  {workers:>2} workers: {rate:7.0f} requests/s, {rate / baseline:.2f}x, {failed} failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "benchmark", nargs="?", choices=["serialization", "streaming", "workers"], help="run only this benchmark"
+    )
+    parser.add_argument("--rows", type=int, default=100_000, help="rows of synthetic results (default: 100000)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="worker counts (default: 1 2 4)")
+    parser.add_argument("--seconds", type=float, default=10, help="length of each load test (default: 10)")
+    args = parser.parse_args()
+    # The serialization benchmark points DUCKDB_FILE at its own synthetic database.
+    database = os.getenv("DUCKDB_FILE")
+
+    if args.benchmark in (None, "serialization", "streaming"):
+        with _synthetic_controller(args.rows) as controller:
+            if args.benchmark in (None, "serialization"):
+                benchmark_serialization(controller, args.rows)
+            if args.benchmark in (None, "streaming"):
+                benchmark_streaming(controller, args.rows)
+    if args.benchmark == "workers" or (args.benchmark is None and database):
+        benchmark_workers(database, args.workers, args.seconds)
@@ -0,0 +1,100 @@
+import hashlib
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Awaitable, Callable
+
+from fastapi import Request, Response, status
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.types import ASGIApp
+
+from database import DatabaseUnavailableError
+
+
+def _make_etag(generation: str, request: Request) -> str:
+    digest = hashlib.sha256(f"{request.url.path}?{request.url.query}".encode()).hexdigest()[:16]
+    return f'"{generation}-{digest}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    return etag.removeprefix("W/") in candidates
+
+
+def _not_modified_since(if_modified_since: str, published_at: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False
+    return published_at.replace(microsecond=0) <= since
+
+
+class GenerationCacheMiddleware(BaseHTTPMiddleware):
+    """
+    HTTP caching for GET requests, tied to the database generation.
+
+    Every response changes only when the ETL publishes a new generation, so the ETag is derived from the generation and
+    the request URL, and Last-Modified is the time the generation was published. A conditional request that still
+    matches is answered with 304 before the route runs, so it never queries the database. Cache-Control is chosen by
+    the longest matching path prefix in `cache_control`; paths with no match get no caching headers.
+
+    `generation` returns the generation and when it was published. It is awaited, so that opening a newly published
+    build does not block the event loop.
+
+    A route may set its own ETag (for example one derived from the response body), which is then left as it is.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        generation: Callable[[], Awaitable[tuple[str, datetime | None]]],
+        cache_control: dict[str, str],
+    ) -> None:
+        super().__init__(app)
+        self._generation = generation
+        self._cache_control = sorted(cache_control.items(), key=lambda rule: len(rule[0]), reverse=True)
+
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        cache_control = self._cache_control_for(request.url.path)
+        if request.method not in ("GET", "HEAD") or cache_control is None:
+            return await call_next(request)
+        if cache_control == "no-store":
+            response = await call_next(request)
+            response.headers["Cache-Control"] = cache_control
+            return response
+
+        try:
+            generation, published_at = await self._generation()
+        except DatabaseUnavailableError:
+            return await call_next(request)
+
+        headers = {"ETag": _make_etag(generation, request), "Cache-Control": cache_control}
+        if published_at is not None:
+            headers["Last-Modified"] = format_datetime(published_at, usegmt=True)
+
+        if_none_match = request.headers.get("if-none-match")
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_none_match is not None:
+            not_modified = etag_matches(if_none_match, headers["ETag"])
+        else:
+            not_modified = (
+                if_modified_since is not None
+                and published_at is not None
+                and _not_modified_since(if_modified_since, published_at)
+            )
+        if not_modified:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        response = await call_next(request)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            for name, value in headers.items():
+                if name not in response.headers:
+                    response.headers[name] = value
+        return response
+
+    def _cache_control_for(self, path: str) -> str | None:
+        for prefix, cache_control in self._cache_control:
+            if path.startswith(prefix):
+                return cache_control
+        return None
@@ -0,0 +1,140 @@
+import zlib
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Arrow IPC streams are sent uncompressed inside, so that any Arrow reader can read them.
+_COMPRESSIBLE_TYPES = ("application/json", "application/vnd.apache.arrow.stream", "text/")
+
+
+def _accepted_encodings(accept_encoding: str) -> dict[str, float]:
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, parameters = item.partition(";")
+        quality = 1.0
+        for parameter in parameters.split(";"):
+            name, _, value = parameter.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip():
+            accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def _is_accepted(accepted: dict[str, float], encoding: str) -> bool:
+    return accepted.get(encoding, accepted.get("*", 0.0)) > 0
+
+
+def accepts_encoding(accept_encoding: str, encoding: str) -> bool:
+    """Whether the client accepts `encoding`, by name or through `*`, with a quality above zero."""
+    return _is_accepted(_accepted_encodings(accept_encoding), encoding)
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    """The best encoding the client accepts, br then gzip, or None to send the response as it is."""
+    accepted = _accepted_encodings(accept_encoding)
+    for encoding in ("br", "gzip"):
+        if _is_accepted(accepted, encoding):
+            return encoding
+    return None
+
+
+class _Compressor:
+    """Compresses a body a chunk at a time, flushing each so that it can be sent as soon as it is ready."""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int) -> None:
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._brotli = None
+            self._gzip = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, last: bool) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.process(data) + (self._brotli.finish() if last else self._brotli.flush())
+        return self._gzip.compress(data) + self._gzip.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with brotli or gzip, as the client's Accept-Encoding allows.
+
+    Unlike Starlette's GZipMiddleware, streamed responses are compressed chunk by chunk and each chunk is flushed, so
+    they still reach the client as they are produced, and brotli is supported. Responses already encoded (like the
+    precomputed ranking pages), of other content types, or whose whole body is under `minimum_size` bytes are sent
+    unchanged. A compressed response's strong ETag is made weak, since it no longer names the uncompressed bytes.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 500, gzip_level: int = 6, brotli_quality: int = 4) -> None:
+        self.app = app
+        self._minimum_size = minimum_size
+        self._gzip_level = gzip_level
+        self._brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Message | None = None
+        pending = b""
+        compressor: _Compressor | None = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, pending, compressor
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if "content-encoding" in headers or not headers.get("content-type", "").startswith(_COMPRESSIBLE_TYPES):
+                    await send(message)
+                else:
+                    # Held back until enough of the body has arrived to tell whether it is worth compressing.
+                    start = message
+                return
+            if message["type"] != "http.response.body" or (start is None and compressor is None):
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                # Even a small body may come in several chunks, for example through BaseHTTPMiddleware.
+                pending += body
+                if more_body and len(pending) < self._minimum_size:
+                    return
+                body, pending = pending, b""
+                if not more_body and len(body) < self._minimum_size:
+                    await send(start)
+                    start = None
+                    await send({"type": "http.response.body", "body": body, "more_body": False})
+                    return
+
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = encoding
+                if "accept-encoding" not in headers.get("vary", "").lower():
+                    headers.add_vary_header("Accept-Encoding")
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+                etag = headers.get("etag")
+                if etag is not None and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+                await send(start)
+                start = None
+                compressor = _Compressor(encoding, self._gzip_level, self._brotli_quality)
+
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": compressor.compress(body, last=not more_body),
+                    "more_body": more_body,
+                }
+            )
+
+        await self.app(scope, receive, send_compressed)
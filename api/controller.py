@@ -1,15 +1,29 @@
-from typing import Literal, Type, TypeVar
+from typing import Callable, Generator, Literal, Type, TypeVar
 
+import base64
+import binascii
+import json
 import os
-from functools import cache
-import duckdb
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, fields
+from datetime import date, datetime
 import dbqueries as db
+from database import ConnectionPool, DatabaseUnavailableError
+from lookup_cache import GenerationCache, generation_cache
+from query_executor import QueryExecutor
+from search_index import PackedStrings, SearchIndex
 
+import pyarrow
+import pyarrow.ipc
 
 from schema import (
     Competition,
     Continent,
+    CacheStats,
     Country,
+    ExportFile,
     Metadata,
     Person,
     Ranking,
@@ -19,6 +33,25 @@ from schema import (
 
 
 DUCKDB = os.getenv("DUCKDB_FILE", ":memory:")
+DUCKDB_POOL_SIZE = int(os.getenv("DUCKDB_POOL_SIZE", "8"))
+DUCKDB_POOL_TIMEOUT = float(os.getenv("DUCKDB_POOL_TIMEOUT", "10"))
+LOOKUP_CACHE_SIZE = int(os.getenv("LOOKUP_CACHE_SIZE", "1024"))
+LOOKUP_CACHE_TTL = float(os.getenv("LOOKUP_CACHE_TTL", "3600"))
+PERSON_SEARCH_BUDGET = float(os.getenv("PERSON_SEARCH_BUDGET", "0.05"))
+QUERY_QUEUE_SIZE = int(os.getenv("QUERY_QUEUE_SIZE", "32"))
+QUERY_TIMEOUT = float(os.getenv("QUERY_TIMEOUT", "10"))
+JSON_STREAM_ROWS = int(os.getenv("JSON_STREAM_ROWS", "1000"))
+# Where the ETL writes the bulk exports of each generation.
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(os.path.dirname(os.path.abspath(DUCKDB)), "exports"))
+
+
+pool = ConnectionPool(DUCKDB, size=DUCKDB_POOL_SIZE, timeout=DUCKDB_POOL_TIMEOUT)
+
+# Runs the blocking calls of async routes, with a thread per connection in the pool.
+query_executor = QueryExecutor(DUCKDB_POOL_SIZE, QUERY_QUEUE_SIZE, QUERY_TIMEOUT, interrupt=pool.interrupt)
+
+# Caches lookups of data that only changes when the ETL publishes a new generation.
+lookup_cache = generation_cache(pool.generation, max_size=LOOKUP_CACHE_SIZE, ttl=LOOKUP_CACHE_TTL)
 
 
 T = TypeVar("T")
@@ -33,8 +66,8 @@ class InvalidRequestError(Exception):
 
 
 def _fetch_structured_data(query: str, result_type: Type[T], params=()) -> list[T]:
-    with duckdb.connect(DUCKDB) as conn:
-        cursor = conn.execute(query, params)
+    with pool.cursor() as cursor:
+        cursor.execute(query, params)
         data = cursor.fetchall()
         if not cursor.description:
             raise ValueError("Cursor has no description")
@@ -42,41 +75,174 @@ def _fetch_structured_data(query: str, result_type: Type[T], params=()) -> list[
         return [result_type(**dict(zip(columns, row))) for row in data]
 
 
+def _json_columns(result_type: type) -> str:
+    # Written the way Pydantic writes a date, or a datetime if the column holds timestamps.
+    return ", ".join(
+        f"""
+        CASE typeof({field.name})
+            WHEN 'DATE' THEN CAST({field.name} AS VARCHAR)
+            ELSE strftime({field.name}, '%Y-%m-%dT%H:%M:%S')
+        END AS {field.name}"""
+        if field.type is date
+        else field.name
+        for field in fields(result_type)
+    )
+
+
+def _stream_json(query: str, result_type: type, params=()) -> Generator[bytes, None, None]:
+    """
+    The rows of `query` as a JSON array of objects with the fields of `result_type`, as FastAPI would render a list of
+    `result_type`, in chunks of up to JSON_STREAM_ROWS rows. DuckDB renders each row, so no Python object is built per
+    row or per value, and only one chunk is held in memory at a time.
+
+    The cursor stays checked out until the generator is exhausted or closed, and may be resumed on any thread.
+    """
+    with pool.cursor() as cursor:
+        cursor.execute(db.SELECT_AS_JSON.format(columns=_json_columns(result_type), query=query), params)
+        opening = b"["
+        while rows := cursor.fetchmany(JSON_STREAM_ROWS):
+            chunk = opening + ",".join(row[0] for row in rows).encode()
+            opening = b","
+            # While suspended the cursor belongs to no thread, so interrupting the one that rendered this chunk (and
+            # has since moved on to other work) leaves it alone.
+            pool.set_user(cursor, None)
+            yield chunk
+            pool.set_user(cursor, threading.get_ident())
+        yield b"[]" if opening == b"[" else b"]"
+
+
+def _fetch_json(query: str, result_type: type, params=()) -> bytes:
+    """All of `_stream_json` at once."""
+    return b"".join(_stream_json(query, result_type, params))
+
+
+_EMPTY_JSON = b"[]"
+
+
+def _resume(first: bytes, chunks: Generator[bytes, None, None]) -> Generator[bytes, None, None]:
+    # Closing this closes `chunks`, and so returns its cursor.
+    yield first
+    yield from chunks
+
+
+def _start_json_stream(
+    query: str, result_type: type, params=(), not_found: str | None = None
+) -> Generator[bytes, None, None]:
+    """
+    `_stream_json`, with the query run and its first chunk rendered before returning, so that errors (and the pool and
+    query timeouts) happen in the caller rather than once the response has started. If `not_found` is given and there
+    are no rows, raises NotFoundError with it.
+    """
+    chunks = _stream_json(query, result_type, params)
+    first = next(chunks)
+    if not_found is not None and first == _EMPTY_JSON:
+        chunks.close()
+        raise NotFoundError(not_found)
+    return _resume(first, chunks)
+
+
+# The representations rows can be sent in besides JSON objects: a JSON object of column arrays, an Arrow IPC stream,
+# or a Parquet file.
+CompactFormat = Literal["columnar", "arrow", "parquet"]
+
+_MEDIA_TYPES: dict[CompactFormat, str] = {
+    "columnar": "application/json",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+@dataclass(frozen=True)
+class FormattedRows:
+    body: bytes
+    media_type: str
+    row_count: int
+
+
+def _fetch_columnar_json(cursor, query: str, result_type: type, params) -> tuple[bytes, int]:
+    names = [field.name for field in fields(result_type)]
+    columns = ", ".join(f"'{name}': coalesce(list({name} ORDER BY _position), [])" for name in names)
+    cursor.execute(
+        db.SELECT_AS_COLUMNAR_JSON.format(columns=columns, json_columns=_json_columns(result_type), query=query), params
+    )
+    row_count, body = cursor.fetchone()
+    return body.encode(), row_count
+
+
+def _fetch_arrow(cursor, query: str, params) -> tuple[bytes, int]:
+    table = cursor.execute(query, params).fetch_arrow_table()
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes(), table.num_rows
+
+
+def _fetch_parquet(cursor, query: str, params) -> tuple[bytes, int]:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "rows.parquet")
+        cursor.execute(db.COPY_TO_PARQUET.format(query=query, path=path.replace("'", "''")), params)
+        row_count = cursor.fetchone()[0]
+        with open(path, "rb") as file:
+            return file.read(), row_count
+
+
+def _render_formatted(cursor, query: str, result_type: type, params, format: CompactFormat) -> FormattedRows:
+    """
+    The rows of `query`, which has the fields of `result_type` as its columns, rendered whole in `format` by DuckDB
+    (or, for Arrow, by pyarrow from DuckDB's Arrow table). Dates are written as they are in JSON, and kept as dates in
+    Arrow and Parquet.
+    """
+    match format:
+        case "columnar":
+            body, row_count = _fetch_columnar_json(cursor, query, result_type, params)
+        case "arrow":
+            body, row_count = _fetch_arrow(cursor, query, params)
+        case "parquet":
+            body, row_count = _fetch_parquet(cursor, query, params)
+    return FormattedRows(body=body, media_type=_MEDIA_TYPES[format], row_count=row_count)
+
+
+def _fetch_formatted(query: str, result_type: type, params, format: CompactFormat) -> FormattedRows:
+    """`_render_formatted` on a cursor of its own."""
+    with pool.cursor() as cursor:
+        return _render_formatted(cursor, query, result_type, params, format)
+
+
 def _fetch_string_list(query: str, params=()) -> list[str]:
-    with duckdb.connect(DUCKDB) as conn:
-        cursor = conn.execute(query, params)
+    with pool.cursor() as cursor:
+        cursor.execute(query, params)
         data = cursor.fetchall()
         if not data:
             raise NotFoundError("No data found")
         return [row[0] for row in data]
 
 
-@cache
+@lookup_cache
 def fetch_countries() -> list[Country]:
     return _fetch_structured_data(db.SELECT_COUNTRIES, Country)
 
 
-@cache
+@lookup_cache
 def fetch_continents() -> list[Continent]:
     return _fetch_structured_data(db.SELECT_CONTINENTS, Continent)
 
 
-@cache
+@lookup_cache
 def fetch_round_types() -> list[RoundType]:
     return _fetch_structured_data(db.SELECT_ROUND_TYPES, RoundType)
 
 
-@cache
+@lookup_cache
 def fetch_continent_ids() -> list[str]:
     return _fetch_string_list(db.SELECT_CONTINENT_IDS)
 
 
-@cache
+@lookup_cache
 def fetch_country_ids() -> list[str]:
     return _fetch_string_list(db.SELECT_COUNTRY_IDS)
 
 
-@cache
+@lookup_cache
 def fetch_country_by_id(country_id: str) -> Country:
     countries = _fetch_structured_data(db.SELECT_COUNTRY_BY_ID, Country, (country_id,))
     if not countries:
@@ -84,14 +250,6 @@ def fetch_country_by_id(country_id: str) -> Country:
     return countries[0]
 
 
-@cache
-def fetch_record_id_for_continent(continent: str) -> str:
-    record = _fetch_string_list(db.SELECT_RECORD_ID_FOR_CONTINENT, (continent,))
-    if not record:
-        raise NotFoundError(f"Continent with id {continent} not found")
-    return record[0]
-
-
 def fetch_person_by_id(person_id: str) -> Person:
     persons = _fetch_structured_data(db.SELECT_PERSON_BY_ID, Person, (person_id,))
     if not persons:
@@ -99,29 +257,64 @@ def fetch_person_by_id(person_id: str) -> Person:
     return persons[0]
 
 
-def fetch_results_by_person_id(person_id: str) -> list[Result]:
-    results = _fetch_structured_data(
-        db.SELECT_RESULT_BY_PERSON_ID, Result, (person_id,)
+@lookup_cache
+def fetch_person_search_index() -> SearchIndex[str]:
+    """WCA IDs of everyone with a result, indexed by ID and every name they have competed under."""
+    with pool.cursor() as cursor:
+        cursor.execute(db.SELECT_SEARCHABLE_PERSONS)
+        persons = cursor.fetchall()
+    return SearchIndex(PackedStrings(wca_id for wca_id, _ in persons), ((wca_id, *names) for wca_id, names in persons))
+
+
+@dataclass(frozen=True)
+class PersonSearchResults:
+    persons: list[Person]
+    complete: bool
+
+
+def fetch_persons_matching_query(query: str, page: int = 1, limit: int = 100) -> PersonSearchResults:
+    """
+    A page of the persons with a result whose WCA ID or name contains the query, ignoring case and accents. The best
+    matches come first, and the best ranked persons among equally good ones. The search stops after
+    `PERSON_SEARCH_BUDGET` seconds, in which case the results are not complete.
+    """
+    if len(query.strip()) < 2:
+        raise InvalidRequestError("Query must be at least 2 characters long")
+
+    index = fetch_person_search_index()
+    deadline = time.monotonic() + PERSON_SEARCH_BUDGET
+    wca_ids, complete = index.search_until(query, page * limit, deadline)
+    wca_ids = wca_ids[(page - 1) * limit :]
+    if not wca_ids:
+        return PersonSearchResults(persons=[], complete=complete)
+
+    persons = fetch_persons_by_ids(wca_ids)
+    return PersonSearchResults(persons=[persons[wca_id] for wca_id in wca_ids if wca_id in persons], complete=complete)
+
+
+def stream_results_json_by_person_id(person_id: str) -> Generator[bytes, None, None]:
+    return _start_json_stream(
+        db.SELECT_RESULT_BY_PERSON_ID, Result, (person_id,), f"Results for person with id {person_id} not found"
     )
-    if not results:
+
+
+def fetch_formatted_results_by_person_id(person_id: str, format: CompactFormat) -> FormattedRows:
+    results = _fetch_formatted(db.SELECT_RESULT_BY_PERSON_ID, Result, (person_id,), format)
+    if results.row_count == 0:
         raise NotFoundError(f"Results for person with id {person_id} not found")
     return results
 
 
-def fetch_single_ranking_for_person(person_id: str) -> list[Ranking]:
-    rankings = _fetch_structured_data(
-        db.SELECT_SINGLE_RANKING_BY_PERSON_ID, Ranking, (person_id,)
-    )
-    if not rankings:
+def fetch_single_ranking_json_for_person(person_id: str) -> bytes:
+    rankings = _fetch_json(db.SELECT_SINGLE_RANKING_BY_PERSON_ID, Ranking, (person_id,))
+    if rankings == _EMPTY_JSON:
         raise NotFoundError(f"Rankings for person with id {person_id} not found")
     return rankings
 
 
-def fetch_mean_ranking_for_person(person_id: str) -> list[Ranking]:
-    rankings = _fetch_structured_data(
-        db.SELECT_MEAN_RANKING_BY_PERSON_ID, Ranking, (person_id,)
-    )
-    if not rankings:
+def fetch_mean_ranking_json_for_person(person_id: str) -> bytes:
+    rankings = _fetch_json(db.SELECT_MEAN_RANKING_BY_PERSON_ID, Ranking, (person_id,))
+    if rankings == _EMPTY_JSON:
         raise NotFoundError(f"Mean rankings for person with id {person_id} not found")
     return rankings
 
@@ -135,101 +328,386 @@ def fetch_competition_by_id(competition_id: str) -> Competition:
     return competitions[0]
 
 
-def fetch_competitions_matching_query(query: str) -> list[Competition]:
+def _fetch_grouped_by_id(
+    query: str, result_type: Type[T], ids: list[str], key: Callable[[T], str]
+) -> dict[str, list[T]]:
+    grouped: dict[str, list[T]] = {}
+    for row in _fetch_structured_data(query, result_type, (ids,)):
+        grouped.setdefault(key(row), []).append(row)
+    return grouped
+
+
+def fetch_competitions_by_ids(competition_ids: list[str]) -> dict[str, Competition]:
+    """The competitions with the given IDs, by ID, read in one query. Unknown IDs are left out."""
+    competitions = _fetch_structured_data(db.SELECT_COMPETITIONS_BY_IDS, Competition, (competition_ids,))
+    return {competition.id: competition for competition in competitions}
+
+
+def fetch_all_competitions_by_ids(competition_ids: list[str]) -> list[Competition]:
+    """The competitions with the given IDs, in the same order, failing if any of them is unknown."""
+    competitions = fetch_competitions_by_ids(competition_ids)
+    for competition_id in competition_ids:
+        if competition_id not in competitions:
+            raise NotFoundError(f"Competition with id {competition_id} not found")
+    return [competitions[competition_id] for competition_id in competition_ids]
+
+
+def fetch_persons_by_ids(person_ids: list[str]) -> dict[str, Person]:
+    """The persons with the given WCA IDs, by WCA ID, read in one query. Unknown IDs are left out."""
+    persons = _fetch_structured_data(db.SELECT_PERSONS_BY_IDS, Person, (person_ids,))
+    return {person.wca_id: person for person in persons}
+
+
+def fetch_results_by_person_ids(person_ids: list[str]) -> dict[str, list[Result]]:
+    return _fetch_grouped_by_id(db.SELECT_RESULTS_BY_PERSON_IDS, Result, person_ids, lambda result: result.person_id)
+
+
+def fetch_single_rankings_by_person_ids(person_ids: list[str]) -> dict[str, list[Ranking]]:
+    return _fetch_grouped_by_id(
+        db.SELECT_SINGLE_RANKINGS_BY_PERSON_IDS, Ranking, person_ids, lambda ranking: ranking.person_id
+    )
+
+
+def fetch_mean_rankings_by_person_ids(person_ids: list[str]) -> dict[str, list[Ranking]]:
+    return _fetch_grouped_by_id(
+        db.SELECT_MEAN_RANKINGS_BY_PERSON_IDS, Ranking, person_ids, lambda ranking: ranking.person_id
+    )
+
+
+@lookup_cache
+def fetch_competition_search_index() -> SearchIndex[Competition]:
+    competitions = _fetch_structured_data(db.SELECT_COMPETITIONS, Competition)
+    return SearchIndex(
+        competitions, ((competition.id, competition.name, competition.country_id) for competition in competitions)
+    )
+
+
+def fetch_competitions_matching_query(query: str, limit: int | None = None) -> list[Competition]:
+    """
+    Competitions whose ID, name or country contains the query, ignoring case and accents. The best matches come first,
+    and the most recent competitions among equally good ones.
+    """
     if (not query) or (len(query) < 3):
         raise InvalidRequestError("Query must be at least 3 characters long")
-    return _fetch_structured_data(
-        db.SELECT_COMPETITION_SEARCH, Competition, (f"%{query.lower()}%",) * 3
-    )
+    return fetch_competition_search_index().search(query, limit)
 
 
-def fetch_results_by_competition_id(competition_id: str) -> list[Result]:
-    results = _fetch_structured_data(
-        db.SELECT_RESULT_BY_COMPETITION_ID, Result, (competition_id,)
+def stream_results_json_by_competition_id(competition_id: str) -> Generator[bytes, None, None]:
+    return _start_json_stream(
+        db.SELECT_RESULT_BY_COMPETITION_ID,
+        Result,
+        (competition_id,),
+        f"Results for competition with id {competition_id} not found",
     )
-    if not results:
-        raise NotFoundError(
-            f"Results for competition with id {competition_id} not found"
-        )
+
+
+def fetch_formatted_results_by_competition_id(competition_id: str, format: CompactFormat) -> FormattedRows:
+    results = _fetch_formatted(db.SELECT_RESULT_BY_COMPETITION_ID, Result, (competition_id,), format)
+    if results.row_count == 0:
+        raise NotFoundError(f"Results for competition with id {competition_id} not found")
     return results
 
 
-def get_rankings_query(region: str, single_or_mean: Literal["single", "mean"]) -> str:
+@dataclass(frozen=True)
+class _Region:
+    """How to query rankings for one region, with the parameters that select the region."""
+
+    single_rankings: str
+    single_rankings_after: str
+    single_rankings_count: str
+    mean_rankings: str
+    mean_rankings_after: str
+    mean_rankings_count: str
+    region_params: tuple[str, ...]
+    rank_field: str
+
+
+@lookup_cache
+def fetch_regions() -> dict[str, _Region]:
+    """Every region id, mapped to how to query it. Built once per database generation."""
+    regions = {
+        "world": _Region(
+            single_rankings=db.SELECT_WORLD_SINGLE_RANKINGS,
+            single_rankings_after=db.SELECT_WORLD_SINGLE_RANKINGS_AFTER,
+            single_rankings_count=db.COUNT_WORLD_SINGLE_RANKINGS,
+            mean_rankings=db.SELECT_WORLD_MEAN_RANKINGS,
+            mean_rankings_after=db.SELECT_WORLD_MEAN_RANKINGS_AFTER,
+            mean_rankings_count=db.COUNT_WORLD_MEAN_RANKINGS,
+            region_params=(),
+            rank_field="world_rank",
+        )
+    }
+    for continent in fetch_continents():
+        regions[continent.id] = _Region(
+            single_rankings=db.SELECT_CONTINENT_SINGLE_RANKINGS,
+            single_rankings_after=db.SELECT_CONTINENT_SINGLE_RANKINGS_AFTER,
+            single_rankings_count=db.COUNT_CONTINENT_SINGLE_RANKINGS,
+            mean_rankings=db.SELECT_CONTINENT_MEAN_RANKINGS,
+            mean_rankings_after=db.SELECT_CONTINENT_MEAN_RANKINGS_AFTER,
+            mean_rankings_count=db.COUNT_CONTINENT_MEAN_RANKINGS,
+            region_params=(continent.id,),
+            rank_field="continent_rank",
+        )
+    for country_id in fetch_country_ids():
+        regions.setdefault(
+            country_id,
+            _Region(
+                single_rankings=db.SELECT_COUNTRY_SINGLE_RANKINGS,
+                single_rankings_after=db.SELECT_COUNTRY_SINGLE_RANKINGS_AFTER,
+                single_rankings_count=db.COUNT_COUNTRY_SINGLE_RANKINGS,
+                mean_rankings=db.SELECT_COUNTRY_MEAN_RANKINGS,
+                mean_rankings_after=db.SELECT_COUNTRY_MEAN_RANKINGS_AFTER,
+                mean_rankings_count=db.COUNT_COUNTRY_MEAN_RANKINGS,
+                region_params=(country_id,),
+                rank_field="country_rank",
+            ),
+        )
+    return regions
+
+
+def _get_region(region: str) -> _Region:
+    try:
+        return fetch_regions()[region]
+    except KeyError:
+        raise NotFoundError(f"Region with id {region} not found") from None
+
+
+_RANKING_PAGE_SIZE = 100
+
+
+def _ranking_page_query(region: str, single_or_mean: Literal["single", "mean"], page: int) -> tuple[str, tuple]:
+    """The query for a numbered page of rankings in a region, and its parameters."""
+    found = _get_region(region)
     match single_or_mean:
         case "single":
-            if region in fetch_continent_ids():
-                return db.SELECT_CONTINENT_SINGLE_RANKINGS
-            if region in fetch_country_ids():
-                return db.SELECT_COUNTRY_SINGLE_RANKINGS
-            raise NotFoundError(f"Region with id {region} not found")
+            query = found.single_rankings
         case "mean":
-            if region in fetch_continent_ids():
-                return db.SELECT_CONTINENT_MEAN_RANKINGS
-            if region in fetch_country_ids():
-                return db.SELECT_COUNTRY_MEAN_RANKINGS
-            raise NotFoundError(f"Region with id {region} not found")
-        case _:
-            raise ValueError(
-                f"Invalid value for single_or_mean: {single_or_mean}. This should not happen."
-            )
+            query = found.mean_rankings
+    return query, (*found.region_params, (page - 1) * _RANKING_PAGE_SIZE, page * _RANKING_PAGE_SIZE)
 
 
 def fetch_single_ranking_by_region(region: str, page: int = 1) -> list[Ranking]:
-    PAGE_SIZE = 100
+    query, params = _ranking_page_query(region, "single", page)
+    return _fetch_structured_data(query, Ranking, params)
 
-    limits = (page - 1) * PAGE_SIZE, page * PAGE_SIZE
 
-    if region == "world":
-        return _fetch_structured_data(db.SELECT_WORLD_SINGLE_RANKINGS, Ranking, limits)
-    else:
-        query = get_rankings_query(region, "single")
-        return _fetch_structured_data(query, Ranking, (region, *limits))
+def fetch_mean_ranking_by_region(region: str, page: int = 1) -> list[Ranking]:
+    query, params = _ranking_page_query(region, "mean", page)
+    return _fetch_structured_data(query, Ranking, params)
 
 
-def fetch_mean_ranking_by_region(region: str, page: int = 1) -> list[Ranking]:
-    PAGE_SIZE = 100
-
-    limits = (page - 1) * PAGE_SIZE, page * PAGE_SIZE
-
-    if region == "world":
-        return _fetch_structured_data(db.SELECT_WORLD_MEAN_RANKINGS, Ranking, limits)
-    else:
-        query = get_rankings_query(region, "mean")
-        return _fetch_structured_data(query, Ranking, (region, *limits))
-
-
-def fetch_record_single_history_by_region(region: str) -> list[Result]:
-    if region == "world":
-        return _fetch_structured_data(db.SELECT_WORLD_RECORD_SINGLE_HISTORY, Result)
-    if region in fetch_continent_ids():
-        recordName = fetch_record_id_for_continent(region)
-        return _fetch_structured_data(
-            db.SELECT_CONTINENT_RECORD_SINGLE_HISTORY,
-            Result,
-            (region, recordName, recordName),
-        )
-    if region in fetch_country_ids():
-        return _fetch_structured_data(
-            db.SELECT_COUNTRY_RECORD_SINGLE_HISTORY, Result, (region,)
-        )
-    raise NotFoundError(f"Region with id {region} not found")
-
-
-def fetch_record_mean_history_by_region(region: str) -> list[Result]:
-    if region == "world":
-        return _fetch_structured_data(db.SELECT_WORLD_RECORD_MEAN_HISTORY, Result)
-    if region in fetch_continent_ids():
-        recordName = fetch_record_id_for_continent(region)
-        return _fetch_structured_data(
-            db.SELECT_CONTINENT_RECORD_MEAN_HISTORY,
-            Result,
-            (region, recordName),
-        )
-    if region in fetch_country_ids():
-        return _fetch_structured_data(
-            db.SELECT_COUNTRY_RECORD_MEAN_HISTORY, Result, (region,)
+def stream_record_single_history_json_by_region(region: str) -> Generator[bytes, None, None]:
+    # An unknown region is not found; a known one without records has an empty history.
+    _get_region(region)
+    return _start_json_stream(db.SELECT_RECORD_SINGLE_HISTORY, Result, (region,))
+
+
+def stream_record_mean_history_json_by_region(region: str) -> Generator[bytes, None, None]:
+    _get_region(region)
+    return _start_json_stream(db.SELECT_RECORD_MEAN_HISTORY, Result, (region,))
+
+
+def fetch_formatted_record_single_history_by_region(region: str, format: CompactFormat) -> FormattedRows:
+    _get_region(region)
+    return _fetch_formatted(db.SELECT_RECORD_SINGLE_HISTORY, Result, (region,), format)
+
+
+def fetch_formatted_record_mean_history_by_region(region: str, format: CompactFormat) -> FormattedRows:
+    _get_region(region)
+    return _fetch_formatted(db.SELECT_RECORD_MEAN_HISTORY, Result, (region,), format)
+
+
+# The bulk exports the ETL writes, by file name, with their media types.
+_EXPORT_MEDIA_TYPES = {
+    f"{table_name}.{extension}": media_type
+    for table_name in ("rankings", "mean_rankings", "results")
+    for extension, media_type in (("parquet", "application/vnd.apache.parquet"), ("csv.gz", "application/gzip"))
+}
+
+
+@dataclass(frozen=True)
+class Export:
+    path: str
+    media_type: str
+    generation: str
+
+
+def fetch_exports(generation: str) -> list[ExportFile]:
+    """The bulk exports of `generation`, if the ETL wrote any for it. Nothing is queried."""
+    generation_dir = os.path.join(EXPORT_DIR, generation)
+    exports = []
+    for name in _EXPORT_MEDIA_TYPES:
+        try:
+            exports.append(ExportFile(name=name, size=os.path.getsize(os.path.join(generation_dir, name))))
+        except FileNotFoundError:
+            pass
+    return exports
+
+
+def fetch_export(name: str, generation: str) -> Export:
+    """Where to read a bulk export of `generation`. Nothing is queried."""
+    if name not in _EXPORT_MEDIA_TYPES:
+        raise NotFoundError(f"Export {name} not found")
+    path = os.path.join(EXPORT_DIR, generation, name)
+    if not os.path.isfile(path):
+        raise NotFoundError(f"Export {name} not found for generation {generation}")
+    return Export(path=path, media_type=_EXPORT_MEDIA_TYPES[name], generation=generation)
+
+
+def fetch_generation() -> str:
+    return pool.generation()
+
+
+def fetch_generation_and_published_at() -> tuple[str, datetime | None]:
+    return pool.generation(), pool.published_at()
+
+
+def fetch_open_generation() -> tuple[str, datetime | None] | None:
+    return pool.open_generation()
+
+
+def fetch_region_ids() -> list[str]:
+    return list(fetch_regions())
+
+
+def fetch_ranking_by_region(region: str, single_or_mean: Literal["single", "mean"], page: int = 1) -> list[Ranking]:
+    match single_or_mean:
+        case "single":
+            return fetch_single_ranking_by_region(region, page)
+        case "mean":
+            return fetch_mean_ranking_by_region(region, page)
+
+
+def fetch_formatted_ranking_by_region(
+    region: str, single_or_mean: Literal["single", "mean"], page: int, format: CompactFormat
+) -> FormattedRows:
+    query, params = _ranking_page_query(region, single_or_mean, page)
+    return _fetch_formatted(query, Ranking, params, format)
+
+
+@dataclass(frozen=True)
+class RankingsPage:
+    rankings: list[Ranking]
+    next_cursor: str | None
+
+
+@dataclass(frozen=True)
+class FormattedRankingsPage:
+    rankings: FormattedRows
+    next_cursor: str | None
+
+
+def _encode_cursor(rank: int, person_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([rank, person_id]).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[int, str]:
+    try:
+        rank, person_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidRequestError(f"Invalid cursor {cursor}") from None
+    if not isinstance(rank, int) or not isinstance(person_id, str):
+        raise InvalidRequestError(f"Invalid cursor {cursor}")
+    return rank, person_id
+
+
+def _rankings_after_query(found: _Region, single_or_mean: Literal["single", "mean"]) -> str:
+    match single_or_mean:
+        case "single":
+            return found.single_rankings_after
+        case "mean":
+            return found.mean_rankings_after
+
+
+def fetch_rankings_after(
+    region: str, single_or_mean: Literal["single", "mean"], limit: int, cursor: str | None = None
+) -> RankingsPage:
+    """
+    Up to `limit` rankings for a region, in rank order, starting after `cursor` (or from the top if there is none).
+    Persons ranked equally are ordered by id, so a page boundary never splits or repeats a tie.
+    """
+    found = _get_region(region)
+    query = _rankings_after_query(found, single_or_mean)
+    rank, person_id = _decode_cursor(cursor) if cursor else (0, "")
+    # One row more than asked for tells whether there is a next page.
+    rankings = _fetch_structured_data(query, Ranking, (*found.region_params, rank, rank, person_id, limit + 1))
+    if len(rankings) <= limit:
+        return RankingsPage(rankings=rankings, next_cursor=None)
+
+    rankings = rankings[:limit]
+    last = rankings[-1]
+    return RankingsPage(rankings=rankings, next_cursor=_encode_cursor(getattr(last, found.rank_field), last.person_id))
+
+
+def fetch_formatted_rankings_after(
+    region: str, single_or_mean: Literal["single", "mean"], limit: int, cursor: str | None, format: CompactFormat
+) -> FormattedRankingsPage:
+    """`fetch_rankings_after`, with the rankings rendered in `format`."""
+    found = _get_region(region)
+    query = _rankings_after_query(found, single_or_mean)
+    rank, person_id = _decode_cursor(cursor) if cursor else (0, "")
+    # The rendered page can't be read back for its last ranking, so that is looked up on its own, on the same cursor so
+    # that both come from the same build even if a new one is published in between.
+    with pool.cursor() as conn:
+        rankings = _render_formatted(conn, query, Ranking, (*found.region_params, rank, rank, person_id, limit), format)
+        conn.execute(
+            db.SELECT_RANKING_PAGE_END.format(rank_field=found.rank_field, query=query),
+            (*found.region_params, rank, rank, person_id, limit + 1, limit - 1),
         )
-    raise NotFoundError(f"Region with id {region} not found")
+        end = conn.fetchall()
+    next_cursor = _encode_cursor(*end[0]) if len(end) == 2 else None
+    return FormattedRankingsPage(rankings=rankings, next_cursor=next_cursor)
+
+
+@lookup_cache
+def fetch_ranking_count(region: str, single_or_mean: Literal["single", "mean"]) -> int:
+    found = _get_region(region)
+    match single_or_mean:
+        case "single":
+            query = found.single_rankings_count
+        case "mean":
+            query = found.mean_rankings_count
+
+    with pool.cursor() as cursor:
+        cursor.execute(query, found.region_params)
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+
+_LOOKUP_CACHES: list[GenerationCache] = [
+    fetch_countries,
+    fetch_continents,
+    fetch_round_types,
+    fetch_continent_ids,
+    fetch_country_ids,
+    fetch_country_by_id,
+    fetch_regions,
+    fetch_ranking_count,
+    fetch_competition_search_index,
+    fetch_person_search_index,
+]
+
+
+def fetch_lookup_cache_stats() -> dict[str, CacheStats]:
+    return {lookup.__name__: lookup.stats() for lookup in _LOOKUP_CACHES}
+
+
+def warm_lookup_caches() -> None:
+    fetch_countries()
+    fetch_continents()
+    fetch_round_types()
+    fetch_continent_ids()
+    fetch_regions()
+    fetch_competition_search_index()
+    fetch_person_search_index()
+    for country_id in fetch_country_ids():
+        fetch_country_by_id(country_id)
+
+
+def check_database_health() -> str:
+    if not pool.check_health():
+        raise DatabaseUnavailableError("Database is not available")
+    return pool.generation()
 
 
 def fetch_metadata() -> Metadata:
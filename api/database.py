@@ -0,0 +1,230 @@
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator
+
+import duckdb
+
+
+_logger = logging.getLogger(__name__)
+
+
+# Errors after which a cursor (and the database handle it belongs to) can no longer be trusted.
+_BROKEN_CONNECTION_ERRORS = (duckdb.ConnectionException, duckdb.FatalException, duckdb.InternalException)
+
+
+# Name the database file is attached under on each handle.
+_ALIAS = "served"
+
+
+class DatabaseUnavailableError(Exception):
+    pass
+
+
+def _file_identity(database: str) -> tuple[int, int] | None:
+    if database == ":memory:":
+        return None
+    try:
+        stat = os.stat(database)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def _read_generation(connection: duckdb.DuckDBPyConnection, identity: tuple[int, int] | None) -> str:
+    """The generation the ETL stamped on the build, or one derived from the file itself for older builds."""
+    try:
+        row = connection.execute("SELECT generation FROM etl_state").fetchone()
+    except duckdb.CatalogException:
+        row = None
+    if row is not None:
+        return row[0]
+    if identity is None:
+        return "memory"
+    return f"{identity[0]}-{identity[1]}"
+
+
+class _DatabaseHandle:
+    """One opened database file and the idle cursors created from it."""
+
+    def __init__(self, database: str) -> None:
+        self.identity = _file_identity(database)
+        # DuckDB reuses an already open database when connecting to the same path again, which would keep serving the
+        # replaced file for as long as any cursor on it is lent out. Attaching the file to a fresh in-memory database
+        # always opens whatever file is at the path now.
+        self.connection = duckdb.connect(":memory:")
+        self.attached = database != ":memory:"
+        if self.attached:
+            try:
+                path = database.replace("'", "''")
+                self.connection.execute(f"ATTACH '{path}' AS {_ALIAS} (READ_ONLY)")
+            except duckdb.Error:
+                self.connection.close()
+                raise
+        self.idle: queue.SimpleQueue[duckdb.DuckDBPyConnection] = queue.SimpleQueue()
+        cursor = self.cursor()
+        self.generation = _read_generation(cursor, self.identity)
+        self.idle.put(cursor)
+        self.in_use = 0
+        self.retired = False
+
+    @property
+    def published_at(self) -> datetime | None:
+        if self.identity is None:
+            return None
+        return datetime.fromtimestamp(self.identity[1] / 1e9, tz=timezone.utc)
+
+    def cursor(self) -> duckdb.DuckDBPyConnection:
+        cursor = self.connection.cursor()
+        if self.attached:
+            cursor.execute(f"USE {_ALIAS}")
+        return cursor
+
+    def close(self) -> None:
+        while not self.idle.empty():
+            self.idle.get_nowait().close()
+        self.connection.close()
+
+
+class ConnectionPool:
+    """
+    A process-wide, read-only handle on the DuckDB file.
+
+    The database is opened once and every request runs on its own cursor borrowed from the pool, so the file catalog is
+    not re-read per request and cursors are never shared between threads. At most `size` cursors are lent out at once.
+
+    When the file on disk is replaced (the ETL publishes a new build by renaming it over the old one) the next checkout
+    opens the new file. Cursors already lent out keep using the old handle, which is closed once they are all returned.
+    Each build has a generation, which changes whenever a new build is opened, so callers can tell when anything they
+    derived from the old build is stale.
+    """
+
+    def __init__(self, database: str, size: int = 8, timeout: float = 10.0) -> None:
+        self._database = database
+        self._timeout = timeout
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._handle: _DatabaseHandle | None = None
+        # The cursors lent out, and the thread using each of them (None while none is).
+        self._lent: dict[duckdb.DuckDBPyConnection, int | None] = {}
+
+    @contextmanager
+    def cursor(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        if not self._slots.acquire(timeout=self._timeout):
+            raise DatabaseUnavailableError("Timed out waiting for a database connection")
+        try:
+            handle, cursor = self._checkout()
+            healthy = True
+            try:
+                yield cursor
+            except _BROKEN_CONNECTION_ERRORS:
+                healthy = False
+                raise
+            finally:
+                self._checkin(handle, cursor, healthy)
+        finally:
+            self._slots.release()
+
+    def generation(self) -> str:
+        """The generation of the build that the next checkout will read, opening it first if it has been replaced."""
+        with self._lock:
+            return self._current_handle().generation
+
+    def published_at(self) -> datetime | None:
+        """When the build that the next checkout will read was published, or None for an in-memory database."""
+        with self._lock:
+            return self._current_handle().published_at
+
+    def open_generation(self) -> tuple[str, datetime | None] | None:
+        """
+        The generation of the open build and when it was published, or None if no build is open yet or the file has
+        been replaced since. Unlike `generation()` this never opens a file or waits for the lock, only stats the file,
+        so it is cheap enough to call on the event loop.
+        """
+        handle = self._handle
+        if handle is None or handle.identity != _file_identity(self._database):
+            return None
+        return handle.generation, handle.published_at
+
+    def check_health(self) -> bool:
+        try:
+            with self.cursor() as cursor:
+                return cursor.execute("SELECT 1").fetchone() == (1,)
+        except (duckdb.Error, DatabaseUnavailableError):
+            _logger.exception("Database health check failed")
+            return False
+
+    def interrupt(self, thread: int) -> None:
+        """Stop the queries running on the cursors `thread` is using, which then raise duckdb.InterruptException."""
+        with self._lock:
+            for cursor, user in self._lent.items():
+                if user == thread:
+                    cursor.interrupt()
+
+    def set_user(self, cursor: duckdb.DuckDBPyConnection, thread: int | None) -> None:
+        """
+        Record that a lent cursor is now used by `thread`, or by no thread (None), for `interrupt()`. A cursor is used
+        by the thread that checked it out unless it is handed on, like the cursor of a result streamed to a client.
+        """
+        with self._lock:
+            self._lent[cursor] = thread
+
+    def close(self) -> None:
+        with self._lock:
+            if self._handle is not None:
+                self._retire(self._handle)
+                self._handle = None
+
+    def _checkout(self) -> tuple[_DatabaseHandle, duckdb.DuckDBPyConnection]:
+        with self._lock:
+            handle = self._current_handle()
+            handle.in_use += 1
+            try:
+                cursor = handle.idle.get_nowait()
+            except queue.Empty:
+                try:
+                    cursor = handle.cursor()
+                except duckdb.Error:
+                    handle.in_use -= 1
+                    raise
+            self._lent[cursor] = threading.get_ident()
+            return handle, cursor
+
+    def _checkin(self, handle: _DatabaseHandle, cursor: duckdb.DuckDBPyConnection, healthy: bool) -> None:
+        with self._lock:
+            del self._lent[cursor]
+            handle.in_use -= 1
+            if not healthy and handle is self._handle:
+                _logger.warning("Discarding database handle after a connection error")
+                self._retire(handle)
+                self._handle = None
+            if healthy and not handle.retired:
+                handle.idle.put(cursor)
+            else:
+                cursor.close()
+            if handle.retired and handle.in_use == 0:
+                handle.close()
+
+    def _current_handle(self) -> _DatabaseHandle:
+        """Must be called with the lock held."""
+        if self._handle is not None and self._handle.identity != _file_identity(self._database):
+            _logger.info("Database file %s has changed, reopening", self._database)
+            self._retire(self._handle)
+            self._handle = None
+
+        if self._handle is None:
+            try:
+                self._handle = _DatabaseHandle(self._database)
+            except duckdb.Error as e:
+                raise DatabaseUnavailableError(f"Could not open database: {e}") from e
+            _logger.info("Opened database generation %s", self._handle.generation)
+        return self._handle
+
+    def _retire(self, handle: _DatabaseHandle) -> None:
+        """Must be called with the lock held."""
+        handle.retired = True
+        if handle.in_use == 0:
+            handle.close()
@@ -3,75 +3,144 @@ SELECT_COUNTRY_IDS = "SELECT id FROM countries"
 SELECT_COUNTRY_BY_ID = "SELECT * FROM countries WHERE id = ?"
 SELECT_CONTINENTS = "SELECT * FROM continents"
 SELECT_CONTINENT_IDS = "SELECT id FROM continents"
-SELECT_RECORD_ID_FOR_CONTINENT = "SELECT record_name FROM continents WHERE id = ?"
 
 SELECT_COMPETITION_BY_ID = "SELECT * FROM competitions WHERE id = ?"
-SELECT_COMPETITION_SEARCH = """
-    SELECT * FROM competitions
-    WHERE LOWER(id) LIKE ? OR LOWER(name) LIKE ? OR LOWER(country_id) LIKE ?
-"""
+SELECT_COMPETITIONS_BY_IDS = "SELECT * FROM competitions WHERE id IN (SELECT UNNEST(?))"
+SELECT_COMPETITIONS = "SELECT * FROM competitions ORDER BY startdate DESC, id"
 SELECT_RESULT_BY_COMPETITION_ID = "SELECT * FROM results WHERE competition_id = ?"
 
 SELECT_ROUND_TYPES = "SELECT * FROM round_types"
 
 SELECT_PERSON_BY_ID = "SELECT * FROM persons WHERE wca_id = ?"
+# Everyone with a result, best ranked first. A person has a row per name they have competed under.
+SELECT_SEARCHABLE_PERSONS = """
+    SELECT persons.wca_id, LIST(DISTINCT persons.name) AS names
+    FROM persons
+    JOIN rankings ON rankings.person_id = persons.wca_id
+    GROUP BY persons.wca_id, rankings.world_rank
+    ORDER BY rankings.world_rank NULLS LAST, persons.wca_id
+"""
+SELECT_PERSONS_BY_IDS = """
+    SELECT * FROM persons
+    WHERE wca_id IN (SELECT UNNEST(?))
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY wca_id ORDER BY sub_id) = 1
+"""
 SELECT_SINGLE_RANKING_BY_PERSON_ID = "SELECT * FROM rankings WHERE person_id = ?"
 SELECT_MEAN_RANKING_BY_PERSON_ID = "SELECT * FROM mean_rankings WHERE person_id = ?"
 SELECT_RESULT_BY_PERSON_ID = "SELECT * FROM results WHERE person_id = ?"
+SELECT_SINGLE_RANKINGS_BY_PERSON_IDS = "SELECT * FROM rankings WHERE person_id IN (SELECT UNNEST(?))"
+SELECT_MEAN_RANKINGS_BY_PERSON_IDS = "SELECT * FROM mean_rankings WHERE person_id IN (SELECT UNNEST(?))"
+SELECT_RESULTS_BY_PERSON_IDS = """
+    SELECT * FROM results
+    WHERE person_id IN (SELECT UNNEST(?))
+    ORDER BY person_id, startdate
+"""
 
 SELECT_WORLD_SINGLE_RANKINGS = """
     SELECT * FROM rankings
     WHERE world_rank > ? AND world_rank <= ? AND best_result > 0
+    ORDER BY world_rank, person_id
 """
+# Regional rankings are read from the copies of the rankings the ETL clusters by region and rank.
 SELECT_CONTINENT_SINGLE_RANKINGS = """
-    SELECT * FROM rankings
+    SELECT * FROM rankings_by_continent
     WHERE continent_id = ? AND continent_rank > ? AND continent_rank <= ? AND best_result > 0
+    ORDER BY continent_rank, person_id
 """
 SELECT_COUNTRY_SINGLE_RANKINGS = """
-    SELECT * FROM rankings
+    SELECT * FROM rankings_by_country
     WHERE person_country_id = ? AND country_rank > ? AND country_rank <= ? AND best_result > 0
+    ORDER BY country_rank, person_id
 """
 
 SELECT_WORLD_MEAN_RANKINGS = """
     SELECT * FROM mean_rankings
     WHERE world_rank > ? AND world_rank <= ? AND best_result > 0
+    ORDER BY world_rank, person_id
 """
 SELECT_CONTINENT_MEAN_RANKINGS = """
-    SELECT * FROM mean_rankings
+    SELECT * FROM mean_rankings_by_continent
     WHERE continent_id = ? AND continent_rank > ? AND continent_rank <= ? AND best_result > 0
+    ORDER BY continent_rank, person_id
 """
 SELECT_COUNTRY_MEAN_RANKINGS = """
-    SELECT * FROM mean_rankings
+    SELECT * FROM mean_rankings_by_country
     WHERE person_country_id = ? AND country_rank > ? AND country_rank <= ? AND best_result > 0
+    ORDER BY country_rank, person_id
 """
 
-SELECT_WORLD_RECORD_SINGLE_HISTORY = """
-    SELECT * FROM results
-    WHERE wca_record = 'WR' OR regional_record = 'WR'
+# Keyset pagination: the rows after the cursor (rank, person_id), in that order. Parameters are the region (if any),
+# then rank, rank, person_id and the number of rows.
+_RANKINGS_AFTER = """
+    SELECT * FROM {table}
+    WHERE {region_filter} best_result > 0
+      AND ({rank} > ? OR ({rank} = ? AND person_id > ?))
+    ORDER BY {rank}, person_id
+    LIMIT ?
 """
-SELECT_CONTINENT_RECORD_SINGLE_HISTORY = """
-    SELECT * FROM results
-    WHERE continent_id = ? AND (wca_record in (?, 'WR') OR regional_record in (?, 'WR'))
-"""
-SELECT_COUNTRY_RECORD_SINGLE_HISTORY = """
-    SELECT * FROM results
-    WHERE person_country_id = ?
-    AND ((wca_record <> '' AND wca_record <> 'PR') OR (regional_record <> '' AND regional_record <> 'PR'))
+_COUNT_RANKINGS = """
+    SELECT COUNT(*) FROM {table}
+    WHERE {region_filter} {rank} IS NOT NULL AND best_result > 0
 """
 
-SELECT_WORLD_RECORD_MEAN_HISTORY = """
-    SELECT * FROM results
-    WHERE regional_mean_record = 'WR'
-"""
-SELECT_CONTINENT_RECORD_MEAN_HISTORY = """
-    SELECT * FROM results
-    WHERE continent_id = ? AND regional_mean_record in (?, 'WR')
+
+def _rankings_queries(table: str, rank: str, region_field: str | None) -> tuple[str, str]:
+    region_filter = f"{region_field} = ? AND" if region_field else ""
+    return (
+        _RANKINGS_AFTER.format(table=table, rank=rank, region_filter=region_filter),
+        _COUNT_RANKINGS.format(table=table, rank=rank, region_filter=region_filter),
+    )
+
+
+SELECT_WORLD_SINGLE_RANKINGS_AFTER, COUNT_WORLD_SINGLE_RANKINGS = _rankings_queries("rankings", "world_rank", None)
+SELECT_CONTINENT_SINGLE_RANKINGS_AFTER, COUNT_CONTINENT_SINGLE_RANKINGS = _rankings_queries(
+    "rankings_by_continent", "continent_rank", "continent_id"
+)
+SELECT_COUNTRY_SINGLE_RANKINGS_AFTER, COUNT_COUNTRY_SINGLE_RANKINGS = _rankings_queries(
+    "rankings_by_country", "country_rank", "person_country_id"
+)
+
+SELECT_WORLD_MEAN_RANKINGS_AFTER, COUNT_WORLD_MEAN_RANKINGS = _rankings_queries("mean_rankings", "world_rank", None)
+SELECT_CONTINENT_MEAN_RANKINGS_AFTER, COUNT_CONTINENT_MEAN_RANKINGS = _rankings_queries(
+    "mean_rankings_by_continent", "continent_rank", "continent_id"
+)
+SELECT_COUNTRY_MEAN_RANKINGS_AFTER, COUNT_COUNTRY_MEAN_RANKINGS = _rankings_queries(
+    "mean_rankings_by_country", "country_rank", "person_country_id"
+)
+
+# The record histories are built by the ETL for every region: 'world', a continent id or a country id.
+SELECT_RECORD_SINGLE_HISTORY = """
+    SELECT * EXCLUDE (region_id) FROM record_history_single
+    WHERE region_id = ?
+    ORDER BY startdate
 """
-SELECT_COUNTRY_RECORD_MEAN_HISTORY = """
-    SELECT * FROM results
-    WHERE person_country_id = ?
-    AND (regional_mean_record <> '' AND regional_mean_record <> 'PR')
+SELECT_RECORD_MEAN_HISTORY = """
+    SELECT * EXCLUDE (region_id) FROM record_history_mean
+    WHERE region_id = ?
+    ORDER BY startdate
 """
 
 SELECT_METADATA = "SELECT export_date AS updated_at FROM metadata"
 
+# Each row of a query as a JSON object, in the order the query returns them.
+SELECT_AS_JSON = """
+    SELECT CAST(to_json(row) AS VARCHAR)
+    FROM (SELECT {columns} FROM ({query})) AS row
+"""
+
+# All rows of a query as one JSON object with an array per column, and the number of rows. The row number is taken
+# before aggregating so that each array keeps the order the query returns the rows in.
+SELECT_AS_COLUMNAR_JSON = """
+    SELECT count(*), CAST(to_json({{{columns}}}) AS VARCHAR)
+    FROM (SELECT *, row_number() OVER () AS _position FROM (SELECT {json_columns} FROM ({query})))
+"""
+
+# Writes the rows of a query to a Parquet file, returning the number of rows written.
+COPY_TO_PARQUET = """
+    COPY ({query}) TO '{path}' (FORMAT parquet)
+"""
+
+# The ranking a page ends on, and whether another follows it: two rows if so, one if the page is the last.
+SELECT_RANKING_PAGE_END = """
+    SELECT {rank_field}, person_id FROM ({query}) LIMIT 2 OFFSET ?
+"""
@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Generic, Hashable, ParamSpec, TypeVar
+
+from schema import CacheStats
+
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+
+class _Entry(Generic[T]):
+    __slots__ = ("value", "expires_at")
+
+    def __init__(self, value: T, expires_at: float) -> None:
+        self.value = value
+        self.expires_at = expires_at
+
+
+class GenerationCache(Generic[P, T]):
+    """
+    A bounded LRU cache of a function's results, for lookups whose answer only changes with the database generation.
+
+    Everything is dropped as soon as `generation()` returns something new, and each entry also expires `ttl` seconds
+    after it was stored. Once `max_size` entries are cached, the least recently used one is evicted. Calls that raise
+    are not cached. Like `functools.cache`, arguments must be hashable.
+    """
+
+    def __init__(self, func: Callable[P, T], generation: Callable[[], str], max_size: int, ttl: float) -> None:
+        self._func = func
+        self._generation = generation
+        self._max_size = max_size
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, _Entry[T]] = OrderedDict()
+        self._seen_generation: str | None = None
+        self._stats = CacheStats(max_size=max_size)
+
+    def __call__(self, *args: P.args, **kwargs: P.kwargs) -> T:
+        key = (args, tuple(sorted(kwargs.items())))
+        generation = self._generation()
+        now = time.monotonic()
+
+        with self._lock:
+            if generation != self._seen_generation:
+                self._entries.clear()
+                self._seen_generation = generation
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self._stats.hits += 1
+                return entry.value
+            self._stats.misses += 1
+
+        value = self._func(*args, **kwargs)
+
+        with self._lock:
+            # Do not store a value read from a generation that has been replaced in the meantime.
+            if generation == self._seen_generation:
+                self._entries[key] = _Entry(value, now + self._ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self._max_size:
+                    self._entries.popitem(last=False)
+                    self._stats.evictions += 1
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self._stats.hits,
+                misses=self._stats.misses,
+                evictions=self._stats.evictions,
+                size=len(self._entries),
+                max_size=self._max_size,
+            )
+
+
+def generation_cache(
+    generation: Callable[[], str], max_size: int, ttl: float
+) -> Callable[[Callable[P, T]], GenerationCache[P, T]]:
+    """Decorator form of `GenerationCache`."""
+
+    def decorator(func: Callable[P, T]) -> GenerationCache[P, T]:
+        return wraps(func)(GenerationCache(func, generation, max_size, ttl))
+
+    return decorator
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, ParamSpec, TypeVar
+
+from database import DatabaseUnavailableError
+from schema import QueryStats
+
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+
+class _Job:
+    """The thread a submitted call is running on, so that it can be interrupted, or None while it is not running."""
+
+    __slots__ = ("thread", "cancelled")
+
+    def __init__(self) -> None:
+        self.thread: int | None = None
+        self.cancelled = False
+
+
+class QueryExecutor:
+    """
+    Runs blocking database work for async routes on a fixed number of threads, keeping the event loop free.
+
+    At most `workers` calls run at once and at most `queue_size` more wait for a thread; beyond that a call fails
+    straight away with DatabaseUnavailableError, rather than piling up work for clients that will have given up on it.
+    A call that has not finished `timeout` seconds after it was submitted, queueing included, fails the same way. If it
+    is still waiting for a thread it never runs; if it is running, `interrupt` is called with its thread's identifier
+    so the query it is blocked on can be stopped. The same happens when the request awaiting it is cancelled.
+    """
+
+    def __init__(self, workers: int, queue_size: int, timeout: float, interrupt: Callable[[int], None]) -> None:
+        self._workers = workers
+        self._queue_size = queue_size
+        self._timeout = timeout
+        self._interrupt = interrupt
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._stats = QueryStats(workers=workers, max_queued=queue_size)
+
+    async def run(self, func: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+        with self._lock:
+            if self._pending >= self._workers + self._queue_size:
+                self._stats.rejected += 1
+                raise DatabaseUnavailableError("Too many queries waiting, try again later")
+            self._pending += 1
+
+        job = _Job()
+        future = self._executor.submit(self._call, job, func, *args, **kwargs)
+        future.add_done_callback(self._done)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self._timeout)
+        except asyncio.TimeoutError:
+            self._cancel(job, future)
+            with self._lock:
+                self._stats.timed_out += 1
+            raise DatabaseUnavailableError(f"Query did not finish within {self._timeout:g} seconds") from None
+        except asyncio.CancelledError:
+            self._cancel(job, future)
+            raise
+
+    def stats(self) -> QueryStats:
+        with self._lock:
+            return QueryStats(
+                workers=self._workers,
+                running=self._running,
+                queued=self._pending - self._running,
+                max_queued=self._queue_size,
+                completed=self._stats.completed,
+                rejected=self._stats.rejected,
+                timed_out=self._stats.timed_out,
+            )
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _call(self, job: _Job, func: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+        with self._lock:
+            if job.cancelled:
+                raise asyncio.CancelledError()
+            job.thread = threading.get_ident()
+            self._running += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                job.thread = None
+                self._running -= 1
+
+    def _done(self, future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+            if not future.cancelled():
+                self._stats.completed += 1
+
+    def _cancel(self, job: _Job, future: Future) -> None:
+        if future.cancel():
+            return
+        # Holding the lock keeps the thread on this job until it has been interrupted, not on the next one.
+        with self._lock:
+            job.cancelled = True
+            if job.thread is not None:
+                self._interrupt(job.thread)
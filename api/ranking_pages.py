@@ -0,0 +1,166 @@
+import gzip
+import hashlib
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Literal
+
+from fastapi import Request, Response, status
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from caching import etag_matches
+from compression import accepts_encoding
+from schema import Ranking
+
+
+_logger = logging.getLogger(__name__)
+
+
+RankingKind = Literal["single", "mean"]
+
+_RANKINGS_ADAPTER = TypeAdapter(list[Ranking])
+
+# Seconds before a failed build of a generation is tried again, doubling with each failure in a row up to the maximum.
+_RETRY_DELAY = 30.0
+_MAX_RETRY_DELAY = 600.0
+
+
+@dataclass(frozen=True)
+class _Page:
+    body: bytes
+    gzipped: bytes
+    etag: str
+
+    @property
+    def gzipped_etag(self) -> str:
+        # A strong ETag identifies the exact bytes sent, so the gzipped copy needs its own.
+        return f'{self.etag[:-1]}-gzip"'
+
+
+def _make_page(rankings: list[Ranking]) -> _Page:
+    # Rendered the same way FastAPI renders a route returning list[Ranking], so the bytes match a live response.
+    body = JSONResponse(_RANKINGS_ADAPTER.dump_python(rankings, mode="json")).body
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    return _Page(body=bytes(body), gzipped=gzip.compress(body, mtime=0), etag=etag)
+
+
+class RankingPages:
+    """
+    The first few pages of single and mean rankings for every region, rendered to JSON once per database generation.
+
+    Rankings only change when the ETL publishes a new generation, so rather than querying and serializing them on every
+    request, the pages are built in a background thread whenever a new generation is seen. Until the build finishes,
+    and for pages beyond the first `pages_per_region`, `response()` returns None and the caller queries as usual. A
+    build that fails (most likely because the database is too busy) is not tried again for that generation until a
+    backoff has passed, so that requests under load do not each start another build.
+    """
+
+    def __init__(
+        self,
+        pages_per_region: int,
+        generation: Callable[[], str],
+        regions: Callable[[], list[str]],
+        fetch: Callable[[str, RankingKind, int], list[Ranking]],
+    ) -> None:
+        self._pages_per_region = pages_per_region
+        self._generation = generation
+        self._regions = regions
+        self._fetch = fetch
+        self._lock = threading.Lock()
+        self._built_generation: str | None = None
+        self._building_generation: str | None = None
+        self._failed_generation: str | None = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self._pages: dict[tuple[RankingKind, str, int], _Page] = {}
+        self._closing = threading.Event()
+        self._builder: threading.Thread | None = None
+
+    def response(self, request: Request, generation: str, kind: RankingKind, region: str, page: int) -> Response | None:
+        """
+        The page, if it is built for `generation`, the generation being served. The caller finds that out itself, so
+        that this never opens the database and can be called on the event loop.
+        """
+        if self._pages_per_region <= 0 or page > self._pages_per_region:
+            return None
+
+        with self._lock:
+            if generation != self._built_generation:
+                self._start_build(generation)
+                return None
+            cached = self._pages.get((kind, region, page))
+
+        if cached is None:
+            return None
+
+        gzipped = accepts_encoding(request.headers.get("accept-encoding", ""), "gzip")
+        headers = {"ETag": cached.gzipped_etag if gzipped else cached.etag, "Vary": "Accept-Encoding"}
+        if etag_matches(request.headers.get("if-none-match", ""), headers["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        if gzipped:
+            headers["Content-Encoding"] = "gzip"
+            return Response(cached.gzipped, media_type="application/json", headers=headers)
+        return Response(cached.body, media_type="application/json", headers=headers)
+
+    def warm(self) -> None:
+        """Start building the pages for the current generation, if they are not built or being built already."""
+        if self._pages_per_region <= 0:
+            return
+        generation = self._generation()
+        with self._lock:
+            if generation != self._built_generation:
+                self._start_build(generation)
+
+    def _start_build(self, generation: str) -> None:
+        """Must be called with the lock held."""
+        if self._building_generation == generation or self._closing.is_set():
+            return
+        if generation == self._failed_generation and time.monotonic() < self._retry_at:
+            return
+        self._building_generation = generation
+        self._builder = threading.Thread(target=self._build, args=(generation,), name="ranking-pages")
+        self._builder.start()
+
+    def close(self) -> None:
+        """Stop any build in progress and wait for it, so that it is not cut off in the middle of a query."""
+        self._closing.set()
+        with self._lock:
+            builder = self._builder
+        if builder is not None:
+            builder.join()
+
+    def _build(self, generation: str) -> None:
+        try:
+            pages: dict[tuple[RankingKind, str, int], _Page] = {}
+            for region in self._regions():
+                for kind in ("single", "mean"):
+                    for page in range(1, self._pages_per_region + 1):
+                        if self._closing.is_set():
+                            return
+                        rankings = self._fetch(region, kind, page)
+                        if page > 1 and not rankings:
+                            break
+                        pages[(kind, region, page)] = _make_page(rankings)
+        except Exception:
+            _logger.exception("Failed to build ranking pages for generation %s", generation)
+            with self._lock:
+                if self._building_generation == generation:
+                    self._building_generation = None
+                    self._failures = self._failures + 1 if self._failed_generation == generation else 1
+                    self._failed_generation = generation
+                    delay = min(_RETRY_DELAY * 2 ** (self._failures - 1), _MAX_RETRY_DELAY)
+                    self._retry_at = time.monotonic() + delay
+                    _logger.info("Building ranking pages for generation %s again in %.0f seconds", generation, delay)
+            return
+
+        with self._lock:
+            if self._building_generation != generation:
+                return
+            self._pages = pages
+            self._built_generation = generation
+            self._building_generation = None
+            self._failed_generation = None
+            self._failures = 0
+        _logger.info("Built %d ranking pages for generation %s", len(pages), generation)
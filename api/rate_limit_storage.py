@@ -0,0 +1,111 @@
+import os
+import sqlite3
+import threading
+import time
+
+from limits.storage import Storage
+
+
+# How many increments between sweeps of expired counters.
+_INCREMENTS_PER_SWEEP = 1000
+
+_CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS counters (
+        key TEXT PRIMARY KEY,
+        count INTEGER NOT NULL,
+        expires_at REAL NOT NULL
+    )
+"""
+# A counter whose window has ended starts again from zero in a new window.
+_INCREMENT = """
+    INSERT INTO counters (key, count, expires_at) VALUES (:key, :amount, :now + :expiry)
+    ON CONFLICT (key) DO UPDATE SET
+        count = CASE WHEN expires_at <= :now THEN :amount ELSE count + :amount END,
+        expires_at = CASE WHEN expires_at <= :now THEN :now + :expiry ELSE expires_at END
+    RETURNING count
+"""
+_SELECT_COUNT = "SELECT count FROM counters WHERE key = ? AND expires_at > ?"
+_SELECT_EXPIRY = "SELECT expires_at FROM counters WHERE key = ? AND expires_at > ?"
+_DELETE_EXPIRED = "DELETE FROM counters WHERE expires_at <= ?"
+
+
+class SQLiteStorage(Storage):
+    """
+    Rate limit counters kept in a SQLite file, so that every worker process on a host counts against the same limits.
+
+    Registered with `limits` for URIs like `sqlite:////var/tmp/rate-limits.sqlite` (an absolute path) or
+    `sqlite:///rate-limits.sqlite` (relative to the working directory). Supports the fixed window strategy, which is
+    what the API's limiter uses. Each process opens its own connection; SQLite's locking keeps the increments atomic.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options: float | str | bool) -> None:
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self._path = uri.removeprefix("sqlite:///")
+        self._timeout = float(options.get("timeout", 5.0))
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+        self._connection_pid: int | None = None
+        self._increments = 0
+
+    @property
+    def base_exceptions(self) -> type[Exception]:
+        return sqlite3.Error
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                count = connection.execute(
+                    _INCREMENT, {"key": key, "amount": amount, "now": now, "expiry": expiry}
+                ).fetchone()[0]
+                self._increments += 1
+                if self._increments % _INCREMENTS_PER_SWEEP == 0:
+                    connection.execute(_DELETE_EXPIRED, (now,))
+        return count
+
+    def get(self, key: str) -> int:
+        with self._lock:
+            row = self._connect().execute(_SELECT_COUNT, (key, time.time())).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        now = time.time()
+        with self._lock:
+            row = self._connect().execute(_SELECT_EXPIRY, (key, now)).fetchone()
+        return row[0] if row else now
+
+    def check(self) -> bool:
+        try:
+            with self._lock:
+                self._connect().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int | None:
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                return connection.execute("DELETE FROM counters").rowcount
+
+    def clear(self, key: str) -> None:
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("DELETE FROM counters WHERE key = ?", (key,))
+
+    def _connect(self) -> sqlite3.Connection:
+        """Must be called with the lock held."""
+        # A connection must not be carried over into a forked worker.
+        if self._connection is None or self._connection_pid != os.getpid():
+            connection = sqlite3.connect(self._path, timeout=self._timeout, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            with connection:
+                connection.execute(_CREATE_TABLE)
+            self._connection = connection
+            self._connection_pid = os.getpid()
+        return self._connection
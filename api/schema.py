@@ -1,5 +1,9 @@
 from dataclasses import dataclass
 from datetime import date, datetime
+from typing import Generic, Literal, TypeVar
+
+
+T = TypeVar("T")
 
 
 @dataclass
@@ -88,6 +92,49 @@ class Metadata:
     updated_at: datetime
 
 
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size: int = 0
+    max_size: int = 0
+
+
+@dataclass
+class QueryStats:
+    workers: int = 0
+    running: int = 0
+    queued: int = 0
+    max_queued: int = 0
+    completed: int = 0
+    rejected: int = 0
+    timed_out: int = 0
+
+
+@dataclass
+class Health:
+    status: str
+    generation: str
+    caches: dict[str, CacheStats]
+    queries: QueryStats
+
+
+@dataclass
+class ExportFile:
+    name: str
+    size: int
+
+
+@dataclass
+class BatchItem(Generic[T]):
+    """The outcome for one of the IDs in a batch request: `data` is set if `status` is 'ok'."""
+
+    id: str
+    status: Literal["ok", "not_found"]
+    data: T | None = None
+
+
 @dataclass
 class ErrorMessage:
     detail: str
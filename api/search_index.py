@@ -0,0 +1,174 @@
+import time
+import unicodedata
+from array import array
+from typing import Generic, Iterable, Sequence, TypeVar, overload
+
+
+T = TypeVar("T")
+
+
+# Separates the fields of an item in its searchable text, and surrounds them, so that a match never spans two fields
+# and the start and end of a field can be matched.
+_FIELD_SEPARATOR = "\x00"
+
+_NO_POSITIONS = array("I")
+
+# How many items a search checks between looks at the clock.
+_CHECKS_PER_DEADLINE = 256
+
+
+def _normalize(text: str) -> str:
+    """Lower case, with accents and other diacritics removed, so that 'sao' finds 'São'."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+class PackedStrings(Sequence[str]):
+    """An immutable list of strings stored as one string and an array of offsets, rather than an object per string."""
+
+    def __init__(self, strings: Iterable[str]) -> None:
+        offsets = array("I", [0])
+        parts = []
+        for string in strings:
+            parts.append(string)
+            offsets.append(offsets[-1] + len(string))
+        self._data = "".join(parts)
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    @overload
+    def __getitem__(self, index: int) -> str: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[str]: ...
+
+    def __getitem__(self, index: int | slice) -> str | list[str]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("PackedStrings index out of range")
+        return self._data[self._offsets[index] : self._offsets[index + 1]]
+
+    def contains(self, index: int, substring: str) -> bool:
+        """Whether the string at `index` contains `substring`, without copying it out."""
+        return self._data.find(substring, self._offsets[index], self._offsets[index + 1]) != -1
+
+
+def _compact(postings: dict[str, list[int]]) -> dict[str, array]:
+    # An array of machine integers takes a fraction of the memory of a list of Python ints.
+    return {trigram: array("I", positions) for trigram, positions in postings.items()}
+
+
+class SearchIndex(Generic[T]):
+    """
+    A substring search over a few text fields of each of a fixed list of items, built once and queried many times.
+
+    Matches are ranked by how well they match: a field equal to the query, then a field starting with it, then a word
+    starting with it, then anywhere. Ties keep the order of the items given, so items should be given most relevant
+    first.
+
+    Each item's fields are normalized and joined into one string. Every trigram (run of three characters) in it maps to
+    the ascending positions of the items containing it, and separate maps hold only the trigrams that start a field or
+    a word. A query of three characters or more only checks the items listed under its trigrams, and stops as soon as
+    it has `limit` matches; shorter queries check every item.
+    """
+
+    def __init__(self, items: Sequence[T], fields: Iterable[Sequence[str | None]]) -> None:
+        """`fields` holds the text fields of each item, in the same order as `items`."""
+        self._items = items
+
+        texts: list[str] = []
+        field_starts: dict[str, list[int]] = {}
+        word_starts: dict[str, list[int]] = {}
+        anywhere: dict[str, list[int]] = {}
+        for position, item_fields in enumerate(fields):
+            normalized = [_normalize(field) for field in item_fields if field]
+            texts.append(_FIELD_SEPARATOR + _FIELD_SEPARATOR.join(normalized) + _FIELD_SEPARATOR)
+
+            item_field_starts = {field[:3] for field in normalized}
+            item_word_starts = set(item_field_starts)
+            item_anywhere: set[str] = set()
+            for field in normalized:
+                item_word_starts.update(field[i + 1 : i + 4] for i, char in enumerate(field) if char == " ")
+                item_anywhere.update(field[i : i + 3] for i in range(len(field) - 2))
+            for postings, trigrams in (
+                (field_starts, item_field_starts),
+                (word_starts, item_word_starts),
+                (anywhere, item_anywhere),
+            ):
+                for trigram in trigrams:
+                    if len(trigram) == 3:
+                        postings.setdefault(trigram, []).append(position)
+
+        if len(texts) != len(items):
+            raise ValueError(f"Got fields for {len(texts)} items, expected {len(items)}")
+        self._texts = PackedStrings(texts)
+        self._field_starts = _compact(field_starts)
+        self._word_starts = _compact(word_starts)
+        self._anywhere = _compact(anywhere)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def search(self, query: str, limit: int | None = None) -> list[T]:
+        return self.search_until(query, limit)[0]
+
+    def search_until(self, query: str, limit: int | None = None, deadline: float | None = None) -> tuple[list[T], bool]:
+        """
+        Like `search`, but gives up once `time.monotonic()` passes `deadline`, returning the matches found so far. Also
+        returns whether the search was complete; if not, better matches than some of those returned may have been
+        missed.
+        """
+        normalized = _normalize(query).strip()
+        if not normalized or _FIELD_SEPARATOR in normalized:
+            return [], True
+
+        if len(normalized) >= 3:
+            first = normalized[:3]
+            rarest = min(
+                (normalized[i : i + 3] for i in range(len(normalized) - 2)),
+                key=lambda trigram: len(self._anywhere.get(trigram, _NO_POSITIONS)),
+            )
+            candidates: Sequence[int] = self._anywhere.get(rarest, _NO_POSITIONS)
+            # Every match contains the rarest trigram, so whichever list is shorter will do.
+            field_candidates: Sequence[int] = min(self._field_starts.get(first, _NO_POSITIONS), candidates, key=len)
+            word_candidates: Sequence[int] = min(self._word_starts.get(first, _NO_POSITIONS), candidates, key=len)
+        else:
+            field_candidates = word_candidates = candidates = range(len(self._items))
+
+        # Fields equal to or starting with the query rank above everything else, so all of them are collected first.
+        equal_field = f"{_FIELD_SEPARATOR}{normalized}{_FIELD_SEPARATOR}"
+        field_start = f"{_FIELD_SEPARATOR}{normalized}"
+        equal: list[int] = []
+        starting: list[int] = []
+        complete = True
+        for checked, position in enumerate(field_candidates):
+            if deadline is not None and checked % _CHECKS_PER_DEADLINE == 0 and time.monotonic() > deadline:
+                complete = False
+                break
+            if self._texts.contains(position, equal_field):
+                equal.append(position)
+            elif self._texts.contains(position, field_start):
+                starting.append(position)
+        found = equal + starting
+
+        if complete and (limit is None or len(found) < limit):
+            seen = set(found)
+            for pattern, positions in ((f" {normalized}", word_candidates), (normalized, candidates)):
+                for checked, position in enumerate(positions):
+                    if deadline is not None and checked % _CHECKS_PER_DEADLINE == 0 and time.monotonic() > deadline:
+                        complete = False
+                        break
+                    if position not in seen and self._texts.contains(position, pattern):
+                        found.append(position)
+                        seen.add(position)
+                        if limit is not None and len(found) >= limit:
+                            break
+                if not complete or (limit is not None and len(found) >= limit):
+                    break
+
+        return [self._items[position] for position in found[:limit]], complete
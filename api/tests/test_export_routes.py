@@ -0,0 +1,65 @@
+import asyncio
+import importlib
+import os
+import sys
+import threading
+
+import duckdb
+import pytest
+from starlette.requests import Request
+
+
+def _publish(path, generation: str) -> None:
+    """Write a build stamped with `generation` and rename it over `path`, as the ETL publishes one."""
+    staging = path.with_suffix(".staging")
+    with duckdb.connect(str(staging)) as conn:
+        conn.execute("CREATE TABLE etl_state AS SELECT ? AS generation", (generation,))
+    os.replace(staging, path)
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    database = tmp_path / "wca.duckdb"
+    _publish(database, "first")
+    for generation in ("first", "second"):
+        (tmp_path / "exports" / generation).mkdir(parents=True)
+        (tmp_path / "exports" / generation / "rankings.parquet").write_bytes(generation.encode())
+    monkeypatch.setenv("DUCKDB_FILE", str(database))
+    monkeypatch.setenv("EXPORT_DIR", str(tmp_path / "exports"))
+    for module in ("api", "controller"):
+        sys.modules.pop(module, None)
+    api = importlib.import_module("api")
+    yield api
+    api.query_executor.close()
+    sys.modules["controller"].pool.close()
+
+
+def _request() -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [], "query_string": b""})
+
+
+def test_export_routes_open_builds_off_the_event_loop(api, tmp_path, monkeypatch):
+    pool = sys.modules["controller"].pool
+    threads = []
+    generation = pool.generation
+
+    def recording_generation() -> str:
+        threads.append(threading.get_ident())
+        return generation()
+
+    monkeypatch.setattr(pool, "generation", recording_generation)
+
+    async def requests() -> tuple[int, list[str], list[str]]:
+        loop_thread = threading.get_ident()
+        names = [export.name for export in await api.get_exports()]
+        first = await api.get_export("rankings.parquet", _request())
+        _publish(tmp_path / "wca.duckdb", "second")
+        second = await api.get_export("rankings.parquet", _request())
+        return loop_thread, names, [first.headers["etag"], second.headers["etag"]]
+
+    loop_thread, names, etags = asyncio.run(requests())
+
+    assert names == ["rankings.parquet"]
+    assert etags == ['"first-rankings.parquet"', '"second-rankings.parquet"']
+    assert threads, "the first request and the publish should each have opened a build"
+    assert loop_thread not in threads
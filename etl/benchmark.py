@@ -0,0 +1,340 @@
+"""
+Benchmarks for the ETL on synthetic data, so changes to it can be measured without a WCA database.
+
+    python benchmark.py [merge_attempts|extraction|lookups] [--scale 10]
+
+A scale of 1 is roughly today's volume of 333mbf results.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Callable
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from extract_and_load import _merge_attempts
+
+
+_RESULTS_PER_SCALE = 50_000
+
+
+def _make_results_and_attempts(scale: int, seed: int = 0) -> tuple[pd.DataFrame, pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    result_count = _RESULTS_PER_SCALE * scale
+
+    results = pd.DataFrame(
+        {
+            "result_id": np.arange(1, result_count + 1),
+            "competition_id": rng.integers(0, 5_000 * scale, result_count).astype(str),
+            "round_type_id": rng.choice(["1", "2", "f", "c"], result_count),
+            "person_name": rng.integers(0, 20_000 * scale, result_count).astype(str),
+            "person_id": rng.integers(0, 20_000 * scale, result_count).astype(str),
+            "person_country_id": rng.integers(0, 200, result_count).astype(str),
+            "wca_record": rng.choice([None, "PR", "NR"], result_count, p=[0.7, 0.25, 0.05]),
+            "wca_pos": rng.integers(1, 50, result_count),
+        }
+    )
+
+    # Most rounds are best of 1, some best of 2 or 3.
+    attempt_counts = rng.choice([1, 2, 3], result_count, p=[0.6, 0.25, 0.15])
+    result_ids = np.repeat(results["result_id"].to_numpy(), attempt_counts)
+    starts = np.repeat(np.cumsum(attempt_counts) - attempt_counts, attempt_counts)
+    attempt_numbers = np.arange(len(result_ids)) - starts + 1
+    attempts = pd.DataFrame(
+        {
+            "result_id": result_ids,
+            "attempt_number": attempt_numbers,
+            "value": rng.integers(500_000_000, 990_000_000, len(result_ids)),
+        }
+    ).sample(frac=1, random_state=seed, ignore_index=True)
+
+    return results, attempts
+
+
+def _merge_attempts_by_attempt_number(results: pd.DataFrame, attempts: pd.DataFrame) -> pd.DataFrame:
+    """The previous implementation of `_merge_attempts`: one filter and one merge per attempt number."""
+    for attempt_number in range(1, 4):
+        col_name = f"value{attempt_number}"
+        values = attempts[attempts["attempt_number"] == attempt_number][["result_id", "value"]].rename(
+            columns={"value": col_name}
+        )
+        results = results.merge(values, how="left", on="result_id")
+        results[col_name] = results[col_name].fillna(0).astype(np.int64)
+
+    return results
+
+
+def _measure(func: Callable[[], pd.DataFrame]) -> tuple[pd.DataFrame, float, float]:
+    """Run `func` and return its result, the elapsed seconds and the peak memory allocated while it ran in MiB."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+def benchmark_merge_attempts(scale: int) -> None:
+    """The pivot of attempts onto results that ETL_EXTRACT_MODE=separate runs, against the one it replaced."""
+    results, attempts = _make_results_and_attempts(scale)
+    print(f"merge_attempts: {len(results)} results, {len(attempts)} attempts")
+
+    expected, elapsed, peak = _measure(lambda: _merge_attempts_by_attempt_number(results.copy(), attempts))
+    print(f"  three merges: {elapsed:.2f}s, peak {peak:.0f} MiB")
+
+    actual, elapsed, peak = _measure(lambda: _merge_attempts(results.copy(), attempts))
+    print(f"  one pass:     {elapsed:.2f}s, peak {peak:.0f} MiB")
+
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+_PIVOTED_ATTEMPTS = """
+    SELECT
+        result_id,
+        MAX(CASE WHEN attempt_number = 1 THEN value END) AS value1,
+        MAX(CASE WHEN attempt_number = 2 THEN value END) AS value2,
+        MAX(CASE WHEN attempt_number = 3 THEN value END) AS value3
+    FROM {attempts}
+    GROUP BY result_id
+"""
+
+
+def _extract_separately(conn: duckdb.DuckDBPyConnection) -> None:
+    """Results and attempts extracted with a query each, and pivoted afterwards."""
+    conn.execute("CREATE TABLE results_raw AS SELECT * FROM wca.results")
+    conn.execute("CREATE TABLE attempts AS SELECT * FROM wca.attempts")
+    conn.execute(
+        f"""
+        CREATE TEMP TABLE pivoted AS
+        SELECT
+            results_raw.*,
+            COALESCE(value1, 0) AS value1,
+            COALESCE(value2, 0) AS value2,
+            COALESCE(value3, 0) AS value3
+        FROM results_raw
+        LEFT JOIN ({_PIVOTED_ATTEMPTS.format(attempts="attempts")}) USING (result_id)
+        """
+    )
+
+
+def _extract_combined(conn: duckdb.DuckDBPyConnection) -> None:
+    """Results extracted with their attempts already pivoted by the source database."""
+    conn.execute(
+        f"""
+        CREATE TABLE results_raw AS
+        SELECT
+            results.*,
+            COALESCE(value1, 0) AS value1,
+            COALESCE(value2, 0) AS value2,
+            COALESCE(value3, 0) AS value3
+        FROM wca.results
+        LEFT JOIN ({_PIVOTED_ATTEMPTS.format(attempts="wca.attempts")}) USING (result_id)
+        """
+    )
+
+
+def benchmark_extraction(scale: int) -> None:
+    """
+    Extracting results and attempts separately, against extracting them pivoted in one query. An in-memory database
+    stands in for the WCA database, so this measures the work on the DuckDB side, not the network.
+    """
+    results, attempts = _make_results_and_attempts(scale)
+    print(f"extraction: {len(results)} results, {len(attempts)} attempts")
+    print(f"  values sent by the WCA database: {results.size + attempts.size} separately, {len(results) * 11} combined")
+
+    for name, extract in (("separately", _extract_separately), ("combined", _extract_combined)):
+        with tempfile.TemporaryDirectory() as directory:
+            database = os.path.join(directory, "benchmark.duckdb")
+            with duckdb.connect(database) as conn:
+                conn.execute("ATTACH ':memory:' AS wca")
+                conn.register("source_results", results)
+                conn.register("source_attempts", attempts)
+                conn.execute("CREATE TABLE wca.results AS SELECT * FROM source_results")
+                conn.execute("CREATE TABLE wca.attempts AS SELECT * FROM source_attempts")
+
+                start = time.perf_counter()
+                extract(conn)
+                conn.execute("CHECKPOINT")
+                elapsed = time.perf_counter() - start
+            size = os.path.getsize(database) / 2**20
+        print(f"  {name + ':':11} {elapsed:.2f}s, file {size:.0f} MiB")
+
+
+# DuckDB's row group size: the unit its min/max statistics can skip.
+_ROW_GROUP_SIZE = 122_880
+
+_LOOKUP_LAYOUTS = {
+    "by date (before)": ("startdate", None),
+    "by person": ("person_id, startdate", None),
+    "by person, competition indexed": ("person_id, startdate", "competition_id"),
+}
+
+
+def _time_lookups(conn: duckdb.DuckDBPyConnection, column: str, keys: list[str]) -> tuple[float, float]:
+    """
+    Mean milliseconds per lookup of `column = key`, and the mean number of row groups whose min/max statistics for
+    `column` admit the key, which are the row groups a scan cannot skip.
+    """
+    start = time.perf_counter()
+    for key in keys:
+        conn.execute(f"SELECT * FROM results WHERE {column} = ?", (key,)).fetchall()
+    elapsed = time.perf_counter() - start
+
+    zonemaps = conn.execute(
+        f"SELECT MIN({column}), MAX({column}) FROM results GROUP BY rowid // {_ROW_GROUP_SIZE}"
+    ).fetchall()
+    candidates = sum(low <= key <= high for key in keys for low, high in zonemaps)
+    return elapsed / len(keys) * 1000, candidates / len(keys)
+
+
+def benchmark_lookups(scale: int, lookups: int = 200) -> None:
+    """
+    Per-person and per-competition lookups in `results`, as the API makes them, with the table stored in date order
+    (as the transform used to leave it) and clustered the way the ETL now stores it. Then pages of country and
+    continent rankings, read from rankings in world rank order (as they used to be) and from the ETL's regional copies.
+    """
+    results, _ = _make_results_and_attempts(scale)
+    rng = np.random.default_rng(1)
+    person_ids = list(rng.choice(results["person_id"].unique(), lookups))
+    competition_ids = list(rng.choice(results["competition_id"].unique(), lookups))
+    row_groups = -(-len(results) // _ROW_GROUP_SIZE)
+    print(f"lookups: {len(results)} results in {row_groups} row groups, {lookups} lookups of each kind")
+
+    for name, (order_by, indexed) in _LOOKUP_LAYOUTS.items():
+        with tempfile.TemporaryDirectory() as directory:
+            database = os.path.join(directory, "benchmark.duckdb")
+            with duckdb.connect(database) as conn:
+                conn.register("source_results", results)
+                # Competitions are numbered in date order, a few days apart.
+                conn.execute(
+                    f"""
+                    CREATE TABLE results AS
+                    SELECT *, DATE '2005-01-01' + CAST(competition_id AS INTEGER) // {scale} AS startdate
+                    FROM source_results
+                    ORDER BY {order_by}
+                    """
+                )
+                if indexed:
+                    conn.execute(f"CREATE INDEX results_{indexed}_idx ON results ({indexed})")
+
+            with duckdb.connect(database, read_only=True) as conn:
+                person_ms, person_row_groups = _time_lookups(conn, "person_id", person_ids)
+                competition_ms, competition_row_groups = _time_lookups(conn, "competition_id", competition_ids)
+        print(f"  {name}:")
+        print(f"    per person:      {person_ms:.2f}ms, {person_row_groups:.1f} row groups not skipped")
+        if indexed == "competition_id":
+            print(f"    per competition: {competition_ms:.2f}ms, looked up in the ART index")
+        else:
+            print(f"    per competition: {competition_ms:.2f}ms, {competition_row_groups:.1f} row groups not skipped")
+
+    _benchmark_regional_pages(results, lookups)
+
+
+# A page of rankings in a region after a cursor, the way the API reads one.
+_REGIONAL_PAGE = """
+    SELECT * FROM {table}
+    WHERE {region_field} = ? AND ({rank_field} > ? OR ({rank_field} = ? AND person_id > ?))
+    ORDER BY {rank_field}, person_id
+    LIMIT 100
+"""
+
+_REGIONS = {"country": ("person_country_id", "country_rank"), "continent": ("continent_id", "continent_rank")}
+
+
+def _time_regional_pages(
+    conn: duckdb.DuckDBPyConnection, table: str, region_field: str, rank_field: str, pages: list[tuple[str, int]]
+) -> tuple[float, float]:
+    """
+    Mean milliseconds per page after each (region, rank), and the mean number of row groups whose min/max statistics
+    admit rows of the region after the rank.
+    """
+    query = _REGIONAL_PAGE.format(table=table, region_field=region_field, rank_field=rank_field)
+    start = time.perf_counter()
+    for region, rank in pages:
+        conn.execute(query, (region, rank, rank, "")).fetchall()
+    elapsed = time.perf_counter() - start
+
+    zonemaps = conn.execute(
+        f"""
+        SELECT MIN({region_field}), MAX({region_field}), MAX({rank_field})
+        FROM {table} GROUP BY rowid // {_ROW_GROUP_SIZE}
+        """
+    ).fetchall()
+    candidates = sum(low <= region <= high and rank < last for region, rank in pages for low, high, last in zonemaps)
+    return elapsed / len(pages) * 1000, candidates / len(pages)
+
+
+def _benchmark_regional_pages(results: pd.DataFrame, pages: int) -> None:
+    rng = np.random.default_rng(2)
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "benchmark.duckdb")
+        with duckdb.connect(database) as conn:
+            conn.register("source_results", results)
+            # A ranking per person, with countries spread over six continents.
+            conn.execute(
+                """
+                CREATE TABLE ranked AS
+                SELECT
+                    *,
+                    RANK() OVER (ORDER BY best_result) AS world_rank,
+                    RANK() OVER (PARTITION BY continent_id ORDER BY best_result) AS continent_rank,
+                    RANK() OVER (PARTITION BY person_country_id ORDER BY best_result) AS country_rank
+                FROM (
+                    SELECT
+                        person_id,
+                        ANY_VALUE(person_country_id) AS person_country_id,
+                        '_' || CAST(ANY_VALUE(person_country_id) AS INTEGER) % 6 AS continent_id,
+                        MIN(wca_pos) * 1000 + hash(person_id) % 1000 AS best_result
+                    FROM source_results
+                    GROUP BY person_id
+                )
+                """
+            )
+            conn.execute("CREATE TABLE rankings AS SELECT * FROM ranked ORDER BY world_rank, person_id")
+            for name, (region_field, rank_field) in _REGIONS.items():
+                conn.execute(
+                    f"""
+                    CREATE TABLE rankings_by_{name} AS
+                    SELECT * FROM ranked ORDER BY {region_field}, {rank_field}, person_id
+                    """
+                )
+            # Pages start anywhere in a region's rankings, as cursors through it do.
+            page_starts = {
+                name: conn.execute(
+                    f"""
+                    SELECT {region_field}, {rank_field} - 1 FROM ranked USING SAMPLE {pages} ROWS (reservoir, 2)
+                    """
+                ).fetchall()
+                for name, (region_field, rank_field) in _REGIONS.items()
+            }
+            row_groups = conn.execute(f"SELECT COUNT(*) // {_ROW_GROUP_SIZE} + 1 FROM ranked").fetchone()[0]
+        print(f"  regional ranking pages: {row_groups} row groups, {pages} pages of 100 of each kind")
+
+        with duckdb.connect(database, read_only=True) as conn:
+            for name, (region_field, rank_field) in _REGIONS.items():
+                for table in ("rankings", f"rankings_by_{name}"):
+                    ms, candidates = _time_regional_pages(conn, table, region_field, rank_field, page_starts[name])
+                    label = f"{name} page from {table}:"
+                    print(f"    {label:42} {ms:.2f}ms, {candidates:.1f} row groups not skipped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "benchmark", nargs="?", choices=["merge_attempts", "extraction", "lookups"], help="run only this benchmark"
+    )
+    parser.add_argument("--scale", type=int, default=10, help="multiple of today's 333mbf volume (default: 10)")
+    args = parser.parse_args()
+
+    if args.benchmark in (None, "merge_attempts"):
+        benchmark_merge_attempts(args.scale)
+    if args.benchmark in (None, "extraction"):
+        benchmark_extraction(args.scale)
+    if args.benchmark in (None, "lookups"):
+        benchmark_lookups(args.scale)
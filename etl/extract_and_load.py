@@ -1,17 +1,51 @@
 import logging
 import math
 import os
+import shutil
+from datetime import datetime, timezone
 from functools import cache
 
 import duckdb
+import numpy as np
 import pandas as pd
 from mysql import connector as mysql
 
+import transform_queries as tq
+
 
 _logger = logging.getLogger(__name__)
 
 
+# Results come with their attempts already pivoted into value1..value3 (0 for a missing attempt), so the WCA DB is
+# scanned once and DuckDB receives one row per result. Read a batch at a time, in result id order.
 _RESULTS_IMPORT_QUERY = """
+FROM mysql_query('wca', '
+    SELECT
+        results.id as result_id,
+        results.competition_id,
+        results.round_type_id,
+        results.person_name,
+        results.person_id,
+        results.person_country_id,
+        results.regional_single_record as wca_record,
+        results.pos as wca_pos,
+        CAST(COALESCE(MAX(CASE WHEN result_attempts.attempt_number = 1 THEN result_attempts.value END), 0) AS SIGNED)
+            AS value1,
+        CAST(COALESCE(MAX(CASE WHEN result_attempts.attempt_number = 2 THEN result_attempts.value END), 0) AS SIGNED)
+            AS value2,
+        CAST(COALESCE(MAX(CASE WHEN result_attempts.attempt_number = 3 THEN result_attempts.value END), 0) AS SIGNED)
+            AS value3
+    FROM results
+    LEFT JOIN result_attempts ON result_attempts.result_id = results.id
+    WHERE results.event_id = ''333mbf'' AND results.id > {after_result_id}
+    GROUP BY results.id
+    ORDER BY results.id
+    LIMIT {batch_size}
+')"""
+
+# With ETL_EXTRACT_MODE=separate, results and their attempts are read with a query each and pivoted by
+# `_merge_attempts`.
+_SEPARATE_RESULTS_IMPORT_QUERY = """
 FROM mysql_query('wca', '
     SELECT
         id as result_id,
@@ -23,7 +57,7 @@ FROM mysql_query('wca', '
         regional_single_record as wca_record,
         pos as wca_pos
     FROM results
-    WHERE event_id = ''333mbf''
+    WHERE event_id = ''333mbf'' AND id > {after_result_id}
 ')"""
 
 _ATTEMPTS_IMPORT_QUERY = """
@@ -33,8 +67,32 @@ FROM mysql_query('wca', '
         result_attempts.attempt_number,
         result_attempts.value
     FROM result_attempts
-    LEFT JOIN results ON result_attempts.result_id = results.id
-    WHERE results.event_id = ''333mbf''
+    JOIN results ON result_attempts.result_id = results.id
+    WHERE results.event_id = ''333mbf'' AND results.id > {after_result_id}
+')"""
+
+# Fingerprints the 333mbf results (and their attempts) up to a given result id. An incremental run compares this with
+# the fingerprint stored by the previous run to tell whether anything it already loaded has changed upstream.
+_RESULTS_SUMMARY_QUERY = """
+FROM mysql_query('wca', '
+    SELECT
+        COUNT(DISTINCT results.id) AS result_count,
+        COALESCE(MAX(results.id), 0) AS last_result_id,
+        CAST(COALESCE(SUM(CRC32(CONCAT_WS(''|'',
+            results.id,
+            results.competition_id,
+            results.round_type_id,
+            results.person_name,
+            results.person_id,
+            results.person_country_id,
+            COALESCE(results.regional_single_record, ''''),
+            results.pos,
+            result_attempts.attempt_number,
+            result_attempts.value
+        ))), 0) AS CHAR) AS checksum
+    FROM results
+    LEFT JOIN result_attempts ON result_attempts.result_id = results.id
+    WHERE results.event_id = ''333mbf'' AND results.id <= {last_result_id}
 ')"""
 
 _COUNTRIES_IMPORT_QUERY = """
@@ -151,8 +209,120 @@ def _get_duckdb_file() -> str:
     return duckdb_file
 
 
-def _write_data_to_duckdb(data: pd.DataFrame, table_name: str) -> None:
+def _get_staging_file() -> str:
+    """
+    The ETL builds into a staging file next to the published one and renames it into place when it is done. The API
+    keeps the published file open read-only, which would block any attempt to write to it directly.
+    """
     duckdb_file = _get_duckdb_file()
+    if duckdb_file == ":memory:":
+        return duckdb_file
+    return f"{duckdb_file}.staging"
+
+
+def _remove_staging_file() -> None:
+    staging_file = _get_staging_file()
+    if staging_file == ":memory:":
+        return
+    _remove_database_file(staging_file)
+
+
+def _remove_database_file(database_file: str) -> None:
+    for path in (database_file, f"{database_file}.wal"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _compact_staging_file() -> None:
+    """
+    Copy the staging file into a fresh one. Blocks freed by replacing or updating tables stay in a DuckDB file as free
+    space; copying leaves them behind, so the published file holds only live data.
+    """
+    staging_file = _get_staging_file()
+    if staging_file == ":memory:":
+        return
+
+    compact_file = f"{staging_file}.compact"
+    _remove_database_file(compact_file)
+    with duckdb.connect() as conn:
+        conn.execute(f"ATTACH '{staging_file}' AS staging (READ_ONLY)")
+        conn.execute(f"ATTACH '{compact_file}' AS compact")
+        conn.execute("COPY FROM DATABASE staging TO compact")
+    os.replace(compact_file, staging_file)
+
+
+def _publish_staging_file() -> None:
+    """
+    Atomically replace the published file with the staging file. Readers see either the old file or the new one, never
+    a partly written one, and a reader that already has the old file open keeps reading it until it closes it.
+    """
+    staging_file = _get_staging_file()
+    if staging_file == ":memory:":
+        return
+
+    _fsync(staging_file)
+    os.replace(staging_file, _get_duckdb_file())
+    _fsync(os.path.dirname(os.path.abspath(staging_file)))
+
+
+def _fsync(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _get_export_dir() -> str | None:
+    """Bulk exports are written next to the published file, in a directory per generation, unless it is in memory."""
+    duckdb_file = _get_duckdb_file()
+    if duckdb_file == ":memory:":
+        return None
+    return os.getenv("EXPORT_DIR", os.path.join(os.path.dirname(os.path.abspath(duckdb_file)), "exports"))
+
+
+def _write_exports(generation: str) -> None:
+    """
+    Export the tables clients download whole from the staging file, in each export format. The files are written into
+    a staging directory that is renamed into place once they are complete, before the build itself is published, so
+    the API never finds a generation's exports missing or partly written.
+    """
+    export_dir = _get_export_dir()
+    if export_dir is None:
+        return
+
+    staging_dir = os.path.join(export_dir, f"{generation}.staging")
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+    with duckdb.connect(_get_staging_file(), read_only=True) as conn:
+        for table_name in tq.EXPORTED_TABLES:
+            for extension in tq.EXPORT_FORMATS:
+                path = os.path.join(staging_dir, f"{table_name}.{extension}")
+                conn.execute(tq.export_table(table_name, extension, path))
+                _fsync(path)
+    os.replace(staging_dir, os.path.join(export_dir, generation))
+    _fsync(export_dir)
+
+
+def _remove_old_exports(generation: str) -> None:
+    """
+    Remove the exports of all but this generation and the one before it, which API workers that have not yet seen the
+    new build may still serve. Downloads already under way keep reading the files they have open.
+    """
+    export_dir = _get_export_dir()
+    if export_dir is None:
+        return
+
+    # Generations are timestamps, so they sort in the order they were built. Left over staging directories go too.
+    names = os.listdir(export_dir)
+    kept = sorted(name for name in names if not name.endswith(".staging") and name <= generation)[-2:]
+    for name in names:
+        if name not in kept:
+            shutil.rmtree(os.path.join(export_dir, name), ignore_errors=True)
+
+
+def _write_data_to_duckdb(data: pd.DataFrame, table_name: str) -> None:
+    duckdb_file = _get_staging_file()
 
     with duckdb.connect(duckdb_file) as conn:
         conn.execute(f"DROP TABLE IF EXISTS {table_name}")
@@ -162,7 +332,7 @@ def _write_data_to_duckdb(data: pd.DataFrame, table_name: str) -> None:
 
 def _write_from_wca_into_duckdb(table_name: str, query: str) -> None:
     """Write data directly from MySQL to DuckDB using DuckDB's MySQL extension."""
-    duckdb_file = _get_duckdb_file()
+    duckdb_file = _get_staging_file()
     with duckdb.connect(duckdb_file) as conn:
         _attach_mysql_to_duckdb(conn)
 
@@ -174,6 +344,49 @@ def _write_from_wca_into_duckdb(table_name: str, query: str) -> None:
         conn.execute("DETACH wca")
 
 
+def _write_batches_from_wca_into_duckdb(table_name: str, query: str, after_result_id: int) -> None:
+    """
+    Write the results after `after_result_id` from MySQL to DuckDB, ETL_BATCH_SIZE at a time, so that neither side
+    holds the whole extraction at once. Each batch continues from the highest result id of the one before.
+    """
+    batch_size = _get_batch_size()
+    duckdb_file = _get_staging_file()
+    with duckdb.connect(duckdb_file) as conn:
+        _attach_mysql_to_duckdb(conn)
+
+        conn.execute(f"DROP TABLE IF EXISTS {table_name}")
+        conn.execute(f"CREATE TABLE {table_name} AS SELECT * {query.format(after_result_id=0, batch_size=0)}")
+        while True:
+            batch = query.format(after_result_id=after_result_id, batch_size=batch_size)
+            row = conn.execute(f"INSERT INTO {table_name} SELECT * {batch}").fetchone()
+            written = row[0] if row else 0
+            _logger.info("Wrote %d results after id %d to '%s'", written, after_result_id, table_name)
+            if written < batch_size:
+                break
+            row = conn.execute(f"SELECT MAX(result_id) FROM {table_name}").fetchone()
+            after_result_id = row[0] if row else after_result_id
+
+        conn.execute("DETACH wca")
+
+
+def _write_results_from_wca_into_duckdb(table_name: str, after_result_id: int) -> None:
+    """Write the results after `after_result_id`, with their attempts as value1..value3, to `table_name`."""
+    match _get_extract_mode():
+        case "combined":
+            _write_batches_from_wca_into_duckdb(table_name, _RESULTS_IMPORT_QUERY, after_result_id)
+        case "separate":
+            attempts_table = table_name.replace("results_raw", "attempts")
+            _write_from_wca_into_duckdb(
+                table_name, _SEPARATE_RESULTS_IMPORT_QUERY.format(after_result_id=after_result_id)
+            )
+            _write_from_wca_into_duckdb(attempts_table, _ATTEMPTS_IMPORT_QUERY.format(after_result_id=after_result_id))
+
+            results = _merge_attempts(_select_from_duckdb(table_name), _select_from_duckdb(attempts_table))
+            _write_data_to_duckdb(results, table_name)
+            _drop_from_duckdb(attempts_table)
+            _logger.info("Merged attempts onto '%s': %d rows", table_name, len(results))
+
+
 def _attach_mysql_to_duckdb(conn: duckdb.DuckDBPyConnection) -> None:
     """Attach to MySQL database using DuckDB's MySQL extension."""
     # Build PostgreSQL-style connection string from environment variables
@@ -193,13 +406,55 @@ def _attach_mysql_to_duckdb(conn: duckdb.DuckDBPyConnection) -> None:
     conn.execute(f"ATTACH '{connection_string}' AS wca (TYPE mysql, READ_ONLY)")
 
 
+def _fetch_one_from_wca(query: str) -> tuple:
+    with duckdb.connect() as conn:
+        _attach_mysql_to_duckdb(conn)
+        row = conn.execute(query).fetchone()
+        conn.execute("DETACH wca")
+    if row is None:
+        raise ValueError("Query returned no rows")
+    return row
+
+
 def _select_from_duckdb(table_name: str) -> pd.DataFrame:
-    duckdb_file = _get_duckdb_file()
+    duckdb_file = _get_staging_file()
     with duckdb.connect(duckdb_file) as conn:
         return conn.execute(f"SELECT * FROM {table_name}").fetchdf()
 
 
+def _drop_from_duckdb(table_name: str) -> None:
+    with duckdb.connect(_get_staging_file()) as conn:
+        conn.execute(f"DROP TABLE IF EXISTS {table_name}")
+
+
+def _merge_attempts(results: pd.DataFrame, attempts: pd.DataFrame) -> pd.DataFrame:
+    """Pivot the attempts onto their results as value1..value3 in a single pass, with 0 for a missing attempt."""
+    rows = pd.Index(results["result_id"]).get_indexer(attempts["result_id"])
+    columns = attempts["attempt_number"].to_numpy() - 1
+    matched = (rows >= 0) & (columns >= 0) & (columns < 3)
+
+    values = np.zeros((len(results), 3), dtype=np.int64)
+    values[rows[matched], columns[matched]] = attempts["value"].to_numpy()[matched]
+
+    results = results.copy()
+    for attempt_number in range(1, 4):
+        results[f"value{attempt_number}"] = values[:, attempt_number - 1]
+    return results
+
+
+# Results from before 2009 used the format 1SSAATTTTT, where SS is 99 minus the cubes solved, AA the cubes attempted and
+# TTTTT the time in seconds. Later results use 0DDTTTTTMM, where DD is 99 minus the points, TTTTT the time in seconds
+# and MM the cubes missed.
+_OLD_MULTI_FORMAT = 1_000_000_000
+
+
 def _multi_result_to_components(result: int) -> tuple[int, int, int]:
+    if result >= _OLD_MULTI_FORMAT:
+        solved = 99 - result // 10_000_000 % 100
+        attempted = result // 100_000 % 100
+        seconds = result % 100_000
+        return solved, attempted, seconds
+
     points = 99 - result // 10_000_000
     seconds = (result % 10_000_000) // 100
     missed = result % 100
@@ -210,6 +465,7 @@ def _multi_result_to_components(result: int) -> tuple[int, int, int]:
 
 
 def _multi_result_to_score(result: int) -> float | None:
+    """Score one encoded 333mbf result. The reference that `_multi_results_to_scores` is tested against."""
     if result == 0 or result is None:
         # Handle no result
         return None
@@ -226,23 +482,43 @@ def _multi_result_to_score(result: int) -> float | None:
     return solved * accuracy / math.sqrt(time_used)
 
 
-def _merge_attempts(results: pd.DataFrame, attempts: pd.DataFrame) -> pd.DataFrame:
-    for attempt_number in range(1, 4):
-        col_name = f"value{attempt_number}"
-        values = attempts[attempts["attempt_number"] == attempt_number][["result_id", "value"]].rename(
-            columns={"value": col_name}
-        )
-        results = results.merge(values, how="left", on="result_id")
-        results[col_name] = results[col_name].fillna(0).astype(int)
+def _multi_results_to_components(results: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Decode an array of encoded 333mbf results into solved, attempted, seconds and time limit arrays."""
+    old_format = results >= _OLD_MULTI_FORMAT
 
-    results.drop(columns=["result_id"], inplace=True)
-    return results
+    points = 99 - results // 10_000_000
+    missed = results % 100
+    solved = np.where(old_format, 99 - results // 10_000_000 % 100, points + missed)
+    attempted = np.where(old_format, results // 100_000 % 100, solved + missed)
+    seconds = np.where(old_format, results % 100_000, (results % 10_000_000) // 100)
+    time_limit = np.where(attempted < 6, attempted * 600, 3600)
+
+    return solved, attempted, seconds, time_limit
+
+
+def _multi_results_to_scores(results: pd.Series) -> pd.Series:
+    """
+    Score a column of encoded 333mbf results. No result (0) scores as missing, while DNF and DNS keep their negative
+    values so that they can be told apart from each other and rank below every valid score.
+    """
+    values = results.to_numpy(dtype=np.int64)
+    solved, attempted, seconds, time_limit = _multi_results_to_components(values)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        accuracy = solved / attempted
+        time_used = seconds / time_limit
+        scores = solved * accuracy / np.sqrt(time_used)
+
+    scores = np.where(values < 0, values, scores)
+    scores = np.where(values == 0, np.nan, scores)
+
+    return pd.Series(scores, index=results.index, dtype=float)
 
 
 def _enhance_results(results: pd.DataFrame, countries: pd.DataFrame, competitions: pd.DataFrame) -> pd.DataFrame:
-    results["score1"] = results["value1"].apply(_multi_result_to_score)
-    results["score2"] = results["value2"].apply(_multi_result_to_score)
-    results["score3"] = results["value3"].apply(_multi_result_to_score)
+    results["score1"] = _multi_results_to_scores(results["value1"])
+    results["score2"] = _multi_results_to_scores(results["value2"])
+    results["score3"] = _multi_results_to_scores(results["value3"])
     results.reset_index(drop=True, inplace=True)
 
     duckdb.register("results", results)
@@ -359,20 +635,16 @@ def _mark_regional_records(
     results[record_column] = None
     results.loc[personal_records & valid_results, record_column] = "PR"
     results.loc[country_records & valid_results, record_column] = "NR"
-    results.loc[continent_records & valid_results, record_column] = "CR"
+    results.loc[continent_records & valid_results, record_column] = _get_continent_record_names(results, continents)
     results.loc[world_records & valid_results, record_column] = "WR"
 
-    results[record_column] = results.apply(
-        lambda row: _convert_CR_to_record_name(row, continents, record_column), axis=1
-    )
-
     return results
 
 
-def _convert_CR_to_record_name(result: pd.Series, continents: pd.DataFrame, record_column: str) -> str:
-    if result[record_column] == "CR":
-        return continents.record_name[continents.id == result.continent_id].values[0]
-    return result[record_column]
+def _get_continent_record_names(results: pd.DataFrame, continents: pd.DataFrame) -> pd.Series:
+    """The name of the continental record (ER, AsR, ...) for the continent of each result."""
+    record_names = continents.set_index("id")["record_name"]
+    return results["continent_id"].map(record_names)
 
 
 def _add_competitor_rankings(results: pd.DataFrame) -> pd.DataFrame:
@@ -392,7 +664,7 @@ def _add_has_results_for_country(countries: pd.DataFrame, results: pd.DataFrame)
 
 def _load_metadata_into_duckdb():
     metadata_file = os.getenv("WCA_METADATA_FILE", "../wca-metadata/metadata.json")
-    duckdb_file = _get_duckdb_file()
+    duckdb_file = _get_staging_file()
 
     if not os.path.exists(metadata_file):
         _logger.warning("Metadata file %s does not exist, skipping metadata load", metadata_file)
@@ -404,26 +676,238 @@ def _load_metadata_into_duckdb():
         conn.execute(f"CREATE TABLE metadata AS SELECT * FROM read_json_auto('{metadata_file}')")
 
 
-def load_from_mysql_to_duckdb():
-    _logger.info("Creating indices in WCA DB")
-    _create_indices()
-    _logger.info("Created indices in WCA DB")
+def _get_transform_mode() -> str:
+    transform_mode = os.getenv("ETL_TRANSFORM_MODE", "pandas")
+    if transform_mode not in ("pandas", "sql"):
+        raise ValueError(f"Invalid ETL_TRANSFORM_MODE: {transform_mode}. Expected 'pandas' or 'sql'.")
+    return transform_mode
+
+
+def _get_extract_mode() -> str:
+    extract_mode = os.getenv("ETL_EXTRACT_MODE", "combined")
+    if extract_mode not in ("combined", "separate"):
+        raise ValueError(f"Invalid ETL_EXTRACT_MODE: {extract_mode}. Expected 'combined' or 'separate'.")
+    return extract_mode
+
+
+def _get_batch_size() -> int:
+    return int(os.getenv("ETL_BATCH_SIZE", "50000"))
+
+
+def _transform_with_pandas() -> None:
+    countries = _select_from_duckdb("countries")
+    continents = _select_from_duckdb("continents")
+    competitions = _select_from_duckdb("competitions")
+    wca_ranks = _select_from_duckdb("wca_ranks")
+
+    results = _select_from_duckdb("results_raw").drop(columns=["result_id"])
+
+    _logger.info("Enhancing results with scores and best results")
+    results = _enhance_results(results, countries, competitions)
+    results = _mark_wca_prs(results)
+    results = _mark_regional_single_records(results, continents)
+    results = _mark_regional_mean_records(results, continents)
+    results = _add_competitor_rankings(results)
+    _write_data_to_duckdb(results, "results")
+    _logger.info("Wrote 'results' to DuckDB: %d rows", len(results))
+
+    countries = _add_has_results_for_country(countries, results)
+    _write_data_to_duckdb(countries, "countries")
+    _logger.info("Updated 'countries' with hasResults and wrote to DuckDB")
+
+    rankings = _get_rankings(results, wca_ranks)
+    _write_data_to_duckdb(rankings, "rankings")
+    _logger.info("Wrote 'rankings' to DuckDB: %d rows", len(rankings))
+
+    mean_score_rankings = _get_mean_score_rankings(results, wca_ranks)
+    _write_data_to_duckdb(mean_score_rankings, "mean_rankings")
+    _logger.info("Wrote 'mean_rankings' to DuckDB: %d rows", len(mean_score_rankings))
+
+
+def _transform_in_duckdb() -> None:
+    """Build the same tables as `_transform_with_pandas`, without pulling any data out of DuckDB."""
+    with duckdb.connect(_get_staging_file()) as conn:
+        conn.execute(tq.CREATE_MACROS)
+
+        _logger.info("Creating 'results' in DuckDB")
+        conn.execute(tq.CREATE_RESULTS)
+        _logger.info("Created 'results' in DuckDB: %d rows", _count_rows(conn, "results"))
+
+        conn.execute(tq.UPDATE_COUNTRIES_HAS_RESULTS)
+        _logger.info("Updated 'countries' with hasResults")
+
+        conn.execute(tq.CREATE_RANKINGS)
+        _logger.info("Created 'rankings' in DuckDB: %d rows", _count_rows(conn, "rankings"))
+
+        conn.execute(tq.CREATE_MEAN_RANKINGS)
+        _logger.info("Created 'mean_rankings' in DuckDB: %d rows", _count_rows(conn, "mean_rankings"))
+
+        conn.execute(tq.DROP_RESULT_ID)
+
+
+def _update_in_duckdb() -> bool:
+    """
+    Apply the results in 'results_raw_delta' to the tables built by an earlier run. Returns False without changing
+    anything if the results already loaded would need recomputing from scratch.
+    """
+    with duckdb.connect(_get_staging_file()) as conn:
+        if _has_table(conn, "attempts"):
+            _logger.info("The last run kept attempts in a table of their own")
+            return False
+
+        changed = conn.execute(tq.COUNT_RESULTS_WITH_CHANGED_REFERENCES).fetchone()
+        if changed and changed[0]:
+            _logger.info("%d loaded results have a changed competition date or region", changed[0])
+            return False
+
+        conn.execute(tq.CREATE_MACROS)
+        new_results = _count_rows(conn, "results_raw_delta")
+        row = conn.execute(tq.SELECT_EARLIEST_DELTA_DATE).fetchone()
+        since = {"since": row[0] if row else None}
+
+        if new_results:
+            _logger.info("Applying %d new results since %s", new_results, since["since"])
+            conn.execute(tq.APPEND_RAW_DELTA)
+            conn.execute(tq.INSERT_RESULTS_DELTA)
+            conn.execute(tq.UPDATE_RECORD_FLAGS_SINCE, since)
+            conn.execute(tq.UPDATE_POSITIONS_FOR_DELTA)
+            conn.execute(tq.CREATE_AFFECTED_PERSONS, since)
+        else:
+            _logger.info("No new results")
+            conn.execute(tq.CREATE_NO_AFFECTED_PERSONS)
+
+        conn.execute(tq.UPDATE_COUNTRIES_HAS_RESULTS)
+        _logger.info("Updated 'countries' with hasResults")
+
+        conn.execute(tq.UPDATE_RANKINGS)
+        conn.execute(tq.UPDATE_MEAN_RANKINGS)
+        _logger.info("Updated rankings for %d persons", _count_rows(conn, "affected_persons"))
+
+        conn.execute(tq.DROP_DELTA)
+
+    return True
+
+
+def _get_column_names(conn: duckdb.DuckDBPyConnection, table_name: str) -> list[str]:
+    return [row[0] for row in conn.execute(tq.SELECT_COLUMN_NAMES, (table_name,)).fetchall()]
+
+
+def _apply_output_schema() -> None:
+    """Give the tables the API reads the types of the output schema, whichever transform built them."""
+    with duckdb.connect(_get_staging_file()) as conn:
+        conn.execute(tq.CREATE_OUTPUT_TYPES)
+        for table_name in tq.TYPED_TABLES:
+            conn.execute(tq.apply_output_types(table_name, _get_column_names(conn, table_name)))
+
+
+def _relax_output_schema() -> None:
+    """
+    Undo the ENUM types of the output schema in a copy of the published build, so that new results can have values
+    they lack. The record histories and regional copies of the rankings use them too, and are dropped, since every run
+    builds them again.
+    """
+    with duckdb.connect(_get_staging_file()) as conn:
+        conn.execute(tq.DROP_RECORD_HISTORIES)
+        conn.execute(tq.DROP_REGIONAL_COPIES)
+        for table_name in tq.TYPED_TABLES:
+            conn.execute(tq.relax_output_types(table_name, _get_column_names(conn, table_name)))
+        conn.execute(tq.DROP_OUTPUT_TYPES)
+
+
+def _create_record_histories() -> None:
+    with duckdb.connect(_get_staging_file()) as conn:
+        conn.execute(tq.CREATE_RECORD_HISTORIES)
+        _logger.info(
+            "Created record histories: %d single and %d mean records",
+            _count_rows(conn, "record_history_single"),
+            _count_rows(conn, "record_history_mean"),
+        )
+
+
+def _cluster_tables() -> None:
+    with duckdb.connect(_get_staging_file()) as conn:
+        conn.execute(tq.CLUSTER_TABLES)
+    _compact_staging_file()
+
+
+def _count_rows(conn: duckdb.DuckDBPyConnection, table_name: str) -> int:
+    row = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()
+    return row[0] if row else 0
+
+
+def _has_table(conn: duckdb.DuckDBPyConnection, table_name: str) -> bool:
+    return conn.execute("SELECT 1 FROM duckdb_tables() WHERE table_name = ?", (table_name,)).fetchone() is not None
+
+
+def _get_incremental() -> bool:
+    return os.getenv("ETL_INCREMENTAL", "false").lower() in ("1", "true", "yes")
+
+
+def _get_results_summary(last_result_id: int) -> tuple[int, int, str]:
+    result_count, last_result_id, checksum = _fetch_one_from_wca(
+        _RESULTS_SUMMARY_QUERY.format(last_result_id=last_result_id)
+    )
+    return int(result_count), int(last_result_id), str(checksum)
 
-    _logger.info("Starting load_from_mysql_to_duckdb")
 
+def _load_etl_state() -> tuple[int, int, str] | None:
+    """The results summary saved by the last run in the published file, if there is one."""
+    duckdb_file = _get_duckdb_file()
+    if duckdb_file == ":memory:" or not os.path.exists(duckdb_file):
+        return None
+
+    with duckdb.connect(duckdb_file, read_only=True) as conn:
+        if not _has_table(conn, "etl_state"):
+            return None
+        # Builds from before the output schema was versioned have no schema_version
+        schema_version = "schema_version" if "schema_version" in _get_column_names(conn, "etl_state") else "NULL"
+        row = conn.execute(f"SELECT result_count, last_result_id, checksum, {schema_version} FROM etl_state").fetchone()
+
+    if row is None:
+        return None
+    if row[3] != tq.OUTPUT_SCHEMA_VERSION:
+        _logger.info("The last run wrote output schema version %s, not %d", row[3], tq.OUTPUT_SCHEMA_VERSION)
+        return None
+    return row[0], row[1], row[2]
+
+
+def _save_etl_state() -> str:
+    """
+    Save the results summary for the next incremental run, along with the generation of this build, which the API uses
+    to tell builds apart. Returns the generation.
+    """
+    generation = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    with duckdb.connect(_get_staging_file()) as conn:
+        row = conn.execute("SELECT COALESCE(MAX(result_id), 0) FROM results_raw").fetchone()
+        result_count, last_result_id, checksum = _get_results_summary(row[0] if row else 0)
+        conn.execute(
+            """
+            CREATE OR REPLACE TABLE etl_state AS
+            SELECT
+                ? AS generation,
+                ? AS result_count,
+                ? AS last_result_id,
+                ? AS checksum,
+                ? AS schema_version,
+                now() AS loaded_at
+            """,
+            (generation, result_count, last_result_id, checksum, tq.OUTPUT_SCHEMA_VERSION),
+        )
+    _logger.info("Saved ETL state: %d results up to id %d", result_count, last_result_id)
+    return generation
+
+
+def _extract_reference_tables() -> None:
     _logger.info("Writing countries from WCA DB into DuckDB")
     _write_from_wca_into_duckdb("countries", _COUNTRIES_IMPORT_QUERY)
-    countries = _select_from_duckdb("countries")
     _logger.info("Wrote 'countries' to DuckDB")
 
     _logger.info("Writing continents from WCA DB into DuckDB")
     _write_from_wca_into_duckdb("continents", _CONTINENTS_IMPORT_QUERY)
-    continents = _select_from_duckdb("continents")
     _logger.info("Wrote 'continents' to DuckDB")
 
     _logger.info("Writing competitions from WCA DB into DuckDB")
     _write_from_wca_into_duckdb("competitions", _COMPETITIONS_IMPORT_QUERY)
-    competitions = _select_from_duckdb("competitions")
     _logger.info("Wrote 'competitions' to DuckDB")
 
     _logger.info("Writing persons from WCA DB into DuckDB")
@@ -436,47 +920,85 @@ def load_from_mysql_to_duckdb():
 
     _logger.info("Writing WCA single ranks from WCA DB into DuckDB")
     _write_from_wca_into_duckdb("wca_ranks", _GET_WCA_SINGLE_RANKS_QUERY)
-    wca_ranks = _select_from_duckdb("wca_ranks")
     _logger.info("Wrote 'wca_ranks' to DuckDB")
 
+
+def _load_in_full(transform_mode: str) -> None:
+    _remove_staging_file()
+    _extract_reference_tables()
+
     _logger.info("Writing results from WCA DB into DuckDB")
-    _write_from_wca_into_duckdb("results_raw", _RESULTS_IMPORT_QUERY)
+    _write_results_from_wca_into_duckdb("results_raw", 0)
     _logger.info("Wrote 'results_raw' to DuckDB")
 
-    _logger.info("Writing attempts from WCA DB into DuckDB")
-    _write_from_wca_into_duckdb("attempts", _ATTEMPTS_IMPORT_QUERY)
-    _logger.info("Wrote 'attempts' to DuckDB")
+    _logger.info("Transforming results using %s", transform_mode)
+    match transform_mode:
+        case "sql":
+            _transform_in_duckdb()
+        case "pandas":
+            _transform_with_pandas()
 
-    _logger.info("Merging results with attempts")
-    attempts = _select_from_duckdb("attempts")
-    results = _select_from_duckdb("results_raw")
-    results = _merge_attempts(results, attempts)
-    _logger.info("Merged results with attempts: %d rows", len(results))
 
-    _logger.info("Enhancing results with scores and best results")
-    results = _enhance_results(results, countries, competitions)
-    results = _mark_wca_prs(results)
-    results = _mark_regional_single_records(results, continents)
-    results = _mark_regional_mean_records(results, continents)
-    results = _add_competitor_rankings(results)
-    _write_data_to_duckdb(results, "results")
-    _logger.info("Wrote 'results' to DuckDB: %d rows", len(results))
+def _load_incrementally(state: tuple[int, int, str]) -> bool:
+    """
+    Load only the results added upstream since the last run into a copy of the published file. Returns False if the
+    results loaded by the last run have changed upstream, in which case a full load is needed.
+    """
+    last_result_id = state[1]
+    if _get_results_summary(last_result_id) != state:
+        _logger.info("Results up to id %d have changed upstream", last_result_id)
+        return False
 
-    countries = _add_has_results_for_country(countries, results)
-    _write_data_to_duckdb(countries, "countries")
-    _logger.info("Updated 'countries' with hasResults and wrote to DuckDB")
+    _remove_staging_file()
+    shutil.copyfile(_get_duckdb_file(), _get_staging_file())
+    _relax_output_schema()
+    _extract_reference_tables()
 
-    rankings = _get_rankings(results, wca_ranks)
-    _write_data_to_duckdb(rankings, "rankings")
-    _logger.info("Wrote 'rankings' to DuckDB: %d rows", len(rankings))
+    _logger.info("Writing results after id %d from WCA DB into DuckDB", last_result_id)
+    _write_results_from_wca_into_duckdb("results_raw_delta", last_result_id)
+    _logger.info("Wrote 'results_raw_delta' to DuckDB")
 
-    mean_score_rankings = _get_mean_score_rankings(results, wca_ranks)
-    _write_data_to_duckdb(mean_score_rankings, "mean_rankings")
-    _logger.info("Wrote 'mean_rankings' to DuckDB: %d rows", len(mean_score_rankings))
+    return _update_in_duckdb()
+
+
+def load_from_mysql_to_duckdb():
+    transform_mode = _get_transform_mode()
+
+    _logger.info("Creating indices in WCA DB")
+    _create_indices()
+    _logger.info("Created indices in WCA DB")
+
+    _logger.info("Starting load_from_mysql_to_duckdb")
+
+    state = _load_etl_state() if _get_incremental() else None
+    if state is not None and _load_incrementally(state):
+        _logger.info("Loaded new results incrementally")
+    else:
+        if state is not None:
+            _logger.info("Falling back to a full load")
+        _load_in_full(transform_mode)
+
+    _apply_output_schema()
+    _logger.info("Applied output schema version %d", tq.OUTPUT_SCHEMA_VERSION)
+
+    _create_record_histories()
+
+    _cluster_tables()
+    _logger.info("Clustered and indexed tables by their lookup keys")
 
     _load_metadata_into_duckdb()
     _logger.info("Loaded metadata into DuckDB (if present)")
 
+    generation = _save_etl_state()
+
+    _write_exports(generation)
+    _logger.info("Wrote bulk exports of generation %s", generation)
+
+    _publish_staging_file()
+    _logger.info("Published generation %s to %s", generation, _get_duckdb_file())
+
+    _remove_old_exports(generation)
+
     _logger.info("Finished load_from_mysql_to_duckdb")
 
 
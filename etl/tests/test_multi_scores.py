@@ -0,0 +1,74 @@
+import math
+
+import duckdb
+import pandas as pd
+import pytest
+
+import transform_queries as tq
+from extract_and_load import _multi_result_to_score, _multi_results_to_scores
+
+
+def _encode(solved: int, attempted: int, seconds: int) -> int:
+    """Encode a result in the 0DDTTTTTMM format used since 2009."""
+    missed = attempted - solved
+    points = solved - missed
+    return (99 - points) * 10_000_000 + seconds * 100 + missed
+
+
+def _encode_old(solved: int, attempted: int, seconds: int) -> int:
+    """Encode a result in the 1SSAATTTTT format used before 2009."""
+    return 1_000_000_000 + (99 - solved) * 10_000_000 + attempted * 100_000 + seconds
+
+
+def _time_limit(attempted: int) -> int:
+    return attempted * 600 if attempted < 6 else 3600
+
+
+def _values() -> list[int]:
+    values = [0, -1, -2]
+    for attempted in [2, 3, 4, 5, 6, 7, 8, 16, 41, 66]:
+        limit = _time_limit(attempted)
+        for solved in range(0, attempted + 1):
+            for seconds in [1, 59, limit // 2, limit - 1, limit]:
+                # A result with fewer points than missed cubes is a DNF, so has no encoding of its own
+                if solved >= attempted - solved:
+                    values.append(_encode(solved, attempted, seconds))
+                values.append(_encode_old(solved, attempted, seconds))
+    # An unknown time in the old format
+    values.append(_encode_old(10, 10, 99_999))
+    return values
+
+
+VALUES = _values()
+
+
+def _assert_matches_scalar(scores: list[float | None]) -> None:
+    assert len(scores) == len(VALUES)
+    for value, score in zip(VALUES, scores):
+        expected = _multi_result_to_score(value)
+        if expected is None:
+            assert score is None or math.isnan(score), value
+        else:
+            assert score == pytest.approx(expected, rel=1e-12, abs=1e-12), value
+
+
+def test_encodings_cover_boundaries() -> None:
+    assert _encode(5, 5, 3000) == 940300000
+    assert _encode_old(2, 2, 1200) == 1970201200
+    assert _multi_result_to_score(_encode(2, 2, 1200)) == pytest.approx(2.0)
+    assert _multi_result_to_score(_encode(6, 6, 3600)) == pytest.approx(6.0)
+    assert _multi_result_to_score(_encode_old(6, 6, 3600)) == pytest.approx(6.0)
+
+
+def test_vectorised_scores_match_scalar() -> None:
+    scores = _multi_results_to_scores(pd.Series(VALUES, index=range(10, 10 + len(VALUES))))
+    assert list(scores.index) == list(range(10, 10 + len(VALUES)))
+    _assert_matches_scalar(scores.tolist())
+
+
+def test_sql_scores_match_scalar() -> None:
+    with duckdb.connect() as conn:
+        conn.execute(tq.CREATE_MACROS)
+        conn.execute("CREATE TABLE encoded AS SELECT unnest(?) AS value, generate_subscripts(?, 1) AS i", [VALUES] * 2)
+        rows = conn.execute("SELECT multi_score(value) FROM encoded ORDER BY i").fetchall()
+    _assert_matches_scalar([row[0] for row in rows])
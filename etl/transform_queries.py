@@ -0,0 +1,654 @@
+"""
+SQL for the DuckDB-native transform. These statements build the same tables as the pandas transform in
+extract_and_load.py, reading the raw tables written by the extraction step and never leaving DuckDB.
+"""
+
+CREATE_MACROS = """
+    CREATE OR REPLACE TEMP MACRO multi_old_format(value) AS value >= 1000000000;
+    CREATE OR REPLACE TEMP MACRO multi_solved(value) AS
+        CASE
+            WHEN multi_old_format(value) THEN 99 - value // 10000000 % 100
+            ELSE 99 - value // 10000000 + value % 100
+        END;
+    CREATE OR REPLACE TEMP MACRO multi_attempted(value) AS
+        CASE WHEN multi_old_format(value) THEN value // 100000 % 100 ELSE multi_solved(value) + value % 100 END;
+    CREATE OR REPLACE TEMP MACRO multi_seconds(value) AS
+        CASE WHEN multi_old_format(value) THEN value % 100000 ELSE (value % 10000000) // 100 END;
+    CREATE OR REPLACE TEMP MACRO multi_time_limit(value) AS
+        CASE WHEN multi_attempted(value) < 6 THEN multi_attempted(value) * 600 ELSE 3600 END;
+    CREATE OR REPLACE TEMP MACRO multi_score(value) AS
+        CASE
+            WHEN value = 0 THEN NULL
+            WHEN value < 0 THEN CAST(value AS DOUBLE)
+            ELSE multi_solved(value) * (multi_solved(value) / multi_attempted(value))
+                / sqrt(multi_seconds(value) / multi_time_limit(value))
+        END;
+    CREATE OR REPLACE TEMP MACRO wca_record_flag(wca_record, best_result, person_best_result) AS
+        CASE
+            WHEN wca_record IS NULL AND best_result > 0 AND best_result = person_best_result THEN 'PR'
+            ELSE wca_record
+        END;
+    CREATE OR REPLACE TEMP MACRO record_flag(score, world_best, continent_best, country_best, person_best, record_name) AS
+        CASE
+            WHEN score <= 0 THEN NULL
+            WHEN score = world_best THEN 'WR'
+            WHEN score = continent_best THEN record_name
+            WHEN score = country_best THEN 'NR'
+            WHEN score = person_best THEN 'PR'
+        END;
+"""
+
+# Scores the results and joins the continent and competition date.
+_SCORED_RESULTS = """
+    WITH scored AS (
+        SELECT
+            *,
+            multi_score(value1) AS score1,
+            multi_score(value2) AS score2,
+            multi_score(value3) AS score3
+        FROM {results_raw}
+    )
+    SELECT
+        scored.*,
+        GREATEST(score1, score2, score3) AS best_score,
+        CASE
+            WHEN score1 = GREATEST(score1, score2, score3) THEN value1
+            WHEN score2 = GREATEST(score1, score2, score3) THEN value2
+            ELSE value3
+        END AS best_result,
+        CASE
+            WHEN value1 <> 0 AND value2 <> 0 AND value3 <> 0 AND (score1 < 0 OR score2 < 0 OR score3 < 0) THEN -1
+            WHEN score1 > 0 AND score2 > 0 AND score3 > 0 THEN (score1 + score2 + score3) / 3
+        END AS mean_score,
+        countries.continent_id,
+        CAST(competitions.startdate AS TIMESTAMP) AS startdate
+    FROM scored
+    LEFT JOIN countries ON scored.person_country_id = countries.id
+    LEFT JOIN competitions ON scored.competition_id = competitions.id
+"""
+
+CREATE_RESULTS = f"""
+    CREATE OR REPLACE TABLE results AS
+    WITH best AS (
+        {_SCORED_RESULTS.format(results_raw="results_raw")}
+    ),
+    -- A result sets a record when no result in its region on an earlier or the same date is better, so each running
+    -- best is taken over all results up to and including the result's date (the default RANGE frame).
+    running_bests AS (
+        SELECT
+            result_id,
+            MIN(CASE WHEN best_result > 0 THEN best_result END) OVER person AS person_best_result,
+            MAX(best_score) OVER world AS world_best_score,
+            CASE WHEN continent_id IS NOT NULL THEN MAX(best_score) OVER continent END AS continent_best_score,
+            CASE WHEN person_country_id IS NOT NULL THEN MAX(best_score) OVER country END AS country_best_score,
+            MAX(best_score) OVER person AS person_best_score,
+            MAX(mean_score) OVER world AS world_best_mean,
+            CASE WHEN continent_id IS NOT NULL THEN MAX(mean_score) OVER continent END AS continent_best_mean,
+            CASE WHEN person_country_id IS NOT NULL THEN MAX(mean_score) OVER country END AS country_best_mean,
+            MAX(mean_score) OVER person AS person_best_mean,
+            RANK() OVER (PARTITION BY competition_id, round_type_id ORDER BY best_score DESC) AS pos
+        FROM (
+            SELECT
+                result_id,
+                competition_id,
+                round_type_id,
+                person_id,
+                person_country_id,
+                continent_id,
+                startdate,
+                best_score,
+                best_result,
+                mean_score
+            FROM best
+        )
+        WINDOW
+            world AS (ORDER BY startdate),
+            continent AS (PARTITION BY continent_id ORDER BY startdate),
+            country AS (PARTITION BY person_country_id ORDER BY startdate),
+            person AS (PARTITION BY person_id ORDER BY startdate)
+    )
+    SELECT
+        competition_id,
+        round_type_id,
+        person_name,
+        person_id,
+        person_country_id,
+        wca_record_flag(wca_record, best_result, person_best_result) AS wca_record,
+        wca_pos,
+        value1,
+        value2,
+        value3,
+        score1,
+        score2,
+        score3,
+        best_score,
+        best_result,
+        mean_score,
+        best.continent_id,
+        startdate,
+        record_flag(
+            best_score,
+            world_best_score,
+            continent_best_score,
+            country_best_score,
+            person_best_score,
+            continents.record_name
+        ) AS regional_record,
+        record_flag(
+            mean_score,
+            world_best_mean,
+            continent_best_mean,
+            country_best_mean,
+            person_best_mean,
+            continents.record_name
+        ) AS regional_mean_record,
+        pos,
+        result_id
+    FROM best
+    JOIN running_bests USING (result_id)
+    LEFT JOIN continents ON best.continent_id = continents.id
+    ORDER BY startdate, mean_score DESC NULLS LAST, best_score DESC NULLS LAST, best_result, result_id
+"""
+
+UPDATE_COUNTRIES_HAS_RESULTS = """
+    CREATE OR REPLACE TABLE countries AS
+    SELECT
+        countries.*,
+        EXISTS (SELECT 1 FROM results WHERE results.person_country_id = countries.id) AS has_results
+    FROM countries
+"""
+
+# The row for each person is their best one by `rank_field`, with ties going to the earliest result.
+_BEST_RESULT_PER_PERSON = """
+    SELECT * EXCLUDE (round_type_id, pos, wca_pos, result_id)
+    FROM {source}
+    WHERE {rank_field} IS NOT NULL
+    QUALIFY ROW_NUMBER() OVER (
+        PARTITION BY person_id
+        ORDER BY {rank_field} DESC, startdate, mean_score DESC NULLS LAST, best_score DESC, best_result, result_id
+    ) = 1
+"""
+
+_RANK_COLUMNS = """
+    CASE WHEN {rank_field} > 0 THEN RANK() OVER (ORDER BY {rank_field} DESC) END AS world_rank,
+    CASE
+        WHEN {rank_field} > 0 AND continent_id IS NOT NULL
+        THEN RANK() OVER (PARTITION BY continent_id ORDER BY {rank_field} DESC)
+    END AS continent_rank,
+    CASE
+        WHEN {rank_field} > 0 AND person_country_id IS NOT NULL
+        THEN RANK() OVER (PARTITION BY person_country_id ORDER BY {rank_field} DESC)
+    END AS country_rank
+"""
+
+_CREATE_RANKINGS_BY_FIELD = """
+    CREATE OR REPLACE TABLE {table_name} AS
+    WITH best AS ({best_result_per_person})
+    SELECT
+        best.*,
+        {rank_columns},
+        wca_world_rank,
+        wca_continent_rank,
+        wca_country_rank
+    FROM best
+    LEFT JOIN wca_ranks ON best.person_id = wca_ranks.person_id
+    ORDER BY {rank_field} DESC
+"""
+
+
+def _create_rankings_by_field(table_name: str, rank_field: str) -> str:
+    return _CREATE_RANKINGS_BY_FIELD.format(
+        table_name=table_name,
+        rank_field=rank_field,
+        best_result_per_person=_BEST_RESULT_PER_PERSON.format(source="results", rank_field=rank_field),
+        rank_columns=_RANK_COLUMNS.format(rank_field=rank_field),
+    )
+
+
+CREATE_RANKINGS = _create_rankings_by_field("rankings", "best_score")
+CREATE_MEAN_RANKINGS = _create_rankings_by_field("mean_rankings", "mean_score")
+
+DROP_RESULT_ID = "ALTER TABLE results DROP COLUMN result_id"
+
+
+# Incremental updates. These apply the results in `results_raw_delta` to tables built by an earlier run. Only results on
+# or after the earliest date in the delta can have their record flags changed by it, so flags are recomputed for those,
+# continuing from the running bests of everything before that date.
+
+# A result is identified by its competition, round and person, since `results` does not keep the WCA result id.
+_RESULT_KEY = "competition_id, round_type_id, person_id"
+
+COUNT_RESULTS_WITH_CHANGED_REFERENCES = """
+    SELECT COUNT(*)
+    FROM results
+    LEFT JOIN competitions ON results.competition_id = competitions.id
+    LEFT JOIN countries ON results.person_country_id = countries.id
+    LEFT JOIN continents ON results.continent_id = continents.id
+    WHERE CAST(competitions.startdate AS TIMESTAMP) IS DISTINCT FROM results.startdate
+        OR countries.continent_id IS DISTINCT FROM results.continent_id
+        OR (results.regional_record NOT IN ('WR', 'NR', 'PR') AND results.regional_record <> continents.record_name)
+        OR (
+            results.regional_mean_record NOT IN ('WR', 'NR', 'PR')
+            AND results.regional_mean_record <> continents.record_name
+        )
+"""
+
+APPEND_RAW_DELTA = "INSERT INTO results_raw BY NAME SELECT * FROM results_raw_delta"
+
+INSERT_RESULTS_DELTA = f"""
+    INSERT INTO results BY NAME
+    SELECT * EXCLUDE (result_id)
+    FROM ({_SCORED_RESULTS.format(results_raw="results_raw_delta")})
+"""
+
+SELECT_EARLIEST_DELTA_DATE = """
+    SELECT MIN(CAST(competitions.startdate AS TIMESTAMP))
+    FROM results_raw_delta
+    JOIN competitions ON results_raw_delta.competition_id = competitions.id
+"""
+
+# Takes the earliest date in the delta as its parameter. Results without a date sort last, so are always recomputed.
+UPDATE_RECORD_FLAGS_SINCE = f"""
+    UPDATE results
+    SET
+        wca_record = flags.wca_record,
+        regional_record = flags.regional_record,
+        regional_mean_record = flags.regional_mean_record
+    FROM (
+        WITH history AS (
+            SELECT person_id, person_country_id, continent_id, best_score, best_result, mean_score
+            FROM results
+            WHERE startdate < $since
+        ),
+        world_history AS (
+            SELECT MAX(best_score) AS best_score, MAX(mean_score) AS mean_score FROM history
+        ),
+        continent_history AS (
+            SELECT continent_id, MAX(best_score) AS best_score, MAX(mean_score) AS mean_score
+            FROM history
+            GROUP BY continent_id
+        ),
+        country_history AS (
+            SELECT person_country_id, MAX(best_score) AS best_score, MAX(mean_score) AS mean_score
+            FROM history
+            GROUP BY person_country_id
+        ),
+        person_history AS (
+            SELECT
+                person_id,
+                MIN(CASE WHEN best_result > 0 THEN best_result END) AS best_result,
+                MAX(best_score) AS best_score,
+                MAX(mean_score) AS mean_score
+            FROM history
+            GROUP BY person_id
+        ),
+        recent AS (
+            SELECT
+                {_RESULT_KEY},
+                results.person_country_id,
+                results.continent_id,
+                results.startdate,
+                results.best_score,
+                results.best_result,
+                results.mean_score,
+                results_raw.wca_record
+            FROM results
+            JOIN results_raw USING ({_RESULT_KEY})
+            WHERE startdate >= $since OR startdate IS NULL OR $since IS NULL
+        ),
+        running_bests AS (
+            SELECT
+                recent.*,
+                LEAST(
+                    MIN(CASE WHEN recent.best_result > 0 THEN recent.best_result END) OVER person,
+                    person_history.best_result
+                ) AS person_best_result,
+                GREATEST(MAX(recent.best_score) OVER world, world_history.best_score) AS world_best_score,
+                CASE
+                    WHEN recent.continent_id IS NOT NULL
+                    THEN GREATEST(MAX(recent.best_score) OVER continent, continent_history.best_score)
+                END AS continent_best_score,
+                CASE
+                    WHEN recent.person_country_id IS NOT NULL
+                    THEN GREATEST(MAX(recent.best_score) OVER country, country_history.best_score)
+                END AS country_best_score,
+                GREATEST(MAX(recent.best_score) OVER person, person_history.best_score) AS person_best_score,
+                GREATEST(MAX(recent.mean_score) OVER world, world_history.mean_score) AS world_best_mean,
+                CASE
+                    WHEN recent.continent_id IS NOT NULL
+                    THEN GREATEST(MAX(recent.mean_score) OVER continent, continent_history.mean_score)
+                END AS continent_best_mean,
+                CASE
+                    WHEN recent.person_country_id IS NOT NULL
+                    THEN GREATEST(MAX(recent.mean_score) OVER country, country_history.mean_score)
+                END AS country_best_mean,
+                GREATEST(MAX(recent.mean_score) OVER person, person_history.mean_score) AS person_best_mean
+            FROM recent
+            CROSS JOIN world_history
+            LEFT JOIN continent_history ON recent.continent_id = continent_history.continent_id
+            LEFT JOIN country_history ON recent.person_country_id = country_history.person_country_id
+            LEFT JOIN person_history ON recent.person_id = person_history.person_id
+            WINDOW
+                world AS (ORDER BY recent.startdate),
+                continent AS (PARTITION BY recent.continent_id ORDER BY recent.startdate),
+                country AS (PARTITION BY recent.person_country_id ORDER BY recent.startdate),
+                person AS (PARTITION BY recent.person_id ORDER BY recent.startdate)
+        )
+        SELECT
+            {_RESULT_KEY},
+            wca_record_flag(wca_record, best_result, person_best_result) AS wca_record,
+            record_flag(
+                best_score,
+                world_best_score,
+                continent_best_score,
+                country_best_score,
+                person_best_score,
+                continents.record_name
+            ) AS regional_record,
+            record_flag(
+                mean_score,
+                world_best_mean,
+                continent_best_mean,
+                country_best_mean,
+                person_best_mean,
+                continents.record_name
+            ) AS regional_mean_record
+        FROM running_bests
+        LEFT JOIN continents ON running_bests.continent_id = continents.id
+    ) AS flags
+    WHERE results.competition_id = flags.competition_id
+        AND results.round_type_id = flags.round_type_id
+        AND results.person_id = flags.person_id
+"""
+
+UPDATE_POSITIONS_FOR_DELTA = f"""
+    UPDATE results
+    SET pos = ranked.pos
+    FROM (
+        SELECT
+            {_RESULT_KEY},
+            RANK() OVER (PARTITION BY competition_id, round_type_id ORDER BY best_score DESC) AS pos
+        FROM results
+        WHERE EXISTS (
+            SELECT 1
+            FROM results_raw_delta
+            WHERE results_raw_delta.competition_id = results.competition_id
+                AND results_raw_delta.round_type_id = results.round_type_id
+        )
+    ) AS ranked
+    WHERE results.competition_id = ranked.competition_id
+        AND results.round_type_id = ranked.round_type_id
+        AND results.person_id = ranked.person_id
+"""
+
+# Takes the earliest date in the delta as its parameter, like UPDATE_RECORD_FLAGS_SINCE.
+CREATE_AFFECTED_PERSONS = """
+    CREATE OR REPLACE TEMP TABLE affected_persons AS
+    SELECT DISTINCT person_id
+    FROM results
+    WHERE startdate >= $since OR startdate IS NULL OR $since IS NULL
+"""
+
+CREATE_NO_AFFECTED_PERSONS = "CREATE OR REPLACE TEMP TABLE affected_persons (person_id VARCHAR)"
+
+_UPDATE_RANKINGS_BY_FIELD = """
+    DELETE FROM {table_name} WHERE person_id IN (SELECT person_id FROM affected_persons);
+
+    INSERT INTO {table_name} BY NAME
+    {best_result_per_person};
+
+    UPDATE {table_name}
+    SET
+        world_rank = ranked.world_rank,
+        continent_rank = ranked.continent_rank,
+        country_rank = ranked.country_rank,
+        wca_world_rank = wca_ranks.wca_world_rank,
+        wca_continent_rank = wca_ranks.wca_continent_rank,
+        wca_country_rank = wca_ranks.wca_country_rank
+    FROM (
+        SELECT person_id, {rank_columns}
+        FROM {table_name}
+    ) AS ranked
+    LEFT JOIN wca_ranks ON ranked.person_id = wca_ranks.person_id
+    WHERE {table_name}.person_id = ranked.person_id;
+"""
+
+# Results of affected persons, with the WCA result id that breaks ties between their best results.
+_AFFECTED_RESULTS = f"""(
+        SELECT results.*, results_raw.result_id
+        FROM results
+        JOIN results_raw USING ({_RESULT_KEY})
+        WHERE person_id IN (SELECT person_id FROM affected_persons)
+    )"""
+
+
+def _update_rankings_by_field(table_name: str, rank_field: str) -> str:
+    return _UPDATE_RANKINGS_BY_FIELD.format(
+        table_name=table_name,
+        best_result_per_person=_BEST_RESULT_PER_PERSON.format(source=_AFFECTED_RESULTS, rank_field=rank_field),
+        rank_columns=_RANK_COLUMNS.format(rank_field=rank_field),
+    )
+
+
+UPDATE_RANKINGS = _update_rankings_by_field("rankings", "best_score")
+UPDATE_MEAN_RANKINGS = _update_rankings_by_field("mean_rankings", "mean_score")
+
+DROP_DELTA = """
+    DROP TABLE IF EXISTS results_raw_delta;
+    DROP TABLE IF EXISTS affected_persons;
+"""
+
+
+# The types of the tables the API reads, whichever transform built them. Bump the version whenever a type changes, so
+# that a build with the old types is rebuilt in full rather than updated incrementally.
+OUTPUT_SCHEMA_VERSION = 2
+
+# Low-cardinality ids and record flags are stored as ENUMs, made from every value in the reference tables and in
+# `results`, so each value takes a byte instead of a string.
+_ENUM_VALUES = {
+    "country_id": "SELECT id FROM countries UNION SELECT person_country_id FROM results",
+    "continent_id": """
+        SELECT id FROM continents UNION SELECT continent_id FROM countries UNION SELECT continent_id FROM results
+    """,
+    "round_type_id": "SELECT id FROM round_types UNION SELECT round_type_id FROM results",
+    "record_flag": """
+        SELECT unnest(['', 'PR', 'NR', 'WR']) UNION SELECT record_name FROM continents
+        UNION SELECT wca_record FROM results
+        UNION SELECT regional_record FROM results
+        UNION SELECT regional_mean_record FROM results
+    """,
+}
+
+_CREATE_ENUM = """
+    DROP TYPE IF EXISTS {type_name};
+    CREATE TYPE {type_name} AS ENUM (
+        SELECT DISTINCT value FROM ({values}) AS enum_values(value) WHERE value IS NOT NULL ORDER BY value
+    );
+"""
+
+CREATE_OUTPUT_TYPES = "".join(
+    _CREATE_ENUM.format(type_name=type_name, values=values) for type_name, values in _ENUM_VALUES.items()
+)
+
+DROP_OUTPUT_TYPES = "".join(f"DROP TYPE IF EXISTS {type_name};" for type_name in _ENUM_VALUES)
+
+# The type of each column of `results` and the tables built from it. Attempt values (which pack the solved, attempted
+# and time components into one number) and ranks fit in 32 bits, and positions in a round in 16.
+_OUTPUT_COLUMN_TYPES = {
+    "competition_id": "VARCHAR",
+    "round_type_id": "round_type_id",
+    "person_name": "VARCHAR",
+    "person_id": "VARCHAR",
+    "person_country_id": "country_id",
+    "continent_id": "continent_id",
+    "startdate": "DATE",
+    "wca_record": "record_flag",
+    "regional_record": "record_flag",
+    "regional_mean_record": "record_flag",
+    "wca_pos": "SMALLINT",
+    "pos": "SMALLINT",
+    "value1": "INTEGER",
+    "value2": "INTEGER",
+    "value3": "INTEGER",
+    "best_result": "INTEGER",
+    "score1": "DOUBLE",
+    "score2": "DOUBLE",
+    "score3": "DOUBLE",
+    "best_score": "DOUBLE",
+    "mean_score": "DOUBLE",
+    "world_rank": "INTEGER",
+    "continent_rank": "INTEGER",
+    "country_rank": "INTEGER",
+    "wca_world_rank": "INTEGER",
+    "wca_continent_rank": "INTEGER",
+    "wca_country_rank": "INTEGER",
+}
+
+TYPED_TABLES = ("results", "rankings", "mean_rankings")
+
+SELECT_COLUMN_NAMES = "SELECT column_name FROM duckdb_columns() WHERE table_name = ? ORDER BY column_index"
+
+_CAST_COLUMNS = """
+    CREATE OR REPLACE TABLE {table_name} AS
+    SELECT * REPLACE ({casts}) FROM {table_name};
+"""
+
+
+def _cast_columns(table_name: str, column_types: dict[str, str]) -> str:
+    casts = ", ".join(f"CAST({column} AS {column_type}) AS {column}" for column, column_type in column_types.items())
+    return _CAST_COLUMNS.format(table_name=table_name, casts=casts)
+
+
+def apply_output_types(table_name: str, columns: list[str]) -> str:
+    """Cast a table's columns to their output types. The ENUM types must have been created first."""
+    return _cast_columns(table_name, {column: _OUTPUT_COLUMN_TYPES[column] for column in columns})
+
+
+def relax_output_types(table_name: str, columns: list[str]) -> str:
+    """
+    Cast a table's ENUM columns back to VARCHAR, so that values the ENUMs do not have can be added, and the ENUMs can
+    be dropped and made again with them.
+    """
+    return _cast_columns(
+        table_name,
+        {column: "VARCHAR" for column in columns if _OUTPUT_COLUMN_TYPES.get(column) in _ENUM_VALUES},
+    )
+
+
+# The records set in each region, so that a region's record history is read as one range of rows. The world is region
+# 'world', continents and countries are regions under their ids. A single record counts if it is an official or an
+# alternative record in the region: WR or the continent's record name on a continent, and any record but a PR in a
+# country.
+CREATE_RECORD_HISTORIES = """
+    CREATE OR REPLACE TABLE record_history_single AS
+    SELECT 'world' AS region_id, * FROM results
+    WHERE wca_record = 'WR' OR regional_record = 'WR'
+    UNION ALL
+    SELECT continents.id AS region_id, results.* FROM results
+    JOIN continents ON results.continent_id = continents.id
+    WHERE results.wca_record IN (continents.record_name, 'WR')
+    OR results.regional_record IN (continents.record_name, 'WR')
+    UNION ALL
+    SELECT person_country_id AS region_id, * FROM results
+    WHERE (wca_record <> '' AND wca_record <> 'PR') OR (regional_record <> '' AND regional_record <> 'PR');
+
+    CREATE OR REPLACE TABLE record_history_mean AS
+    SELECT 'world' AS region_id, * FROM results
+    WHERE regional_mean_record = 'WR'
+    UNION ALL
+    SELECT continents.id AS region_id, results.* FROM results
+    JOIN continents ON results.continent_id = continents.id
+    WHERE results.regional_mean_record IN (continents.record_name, 'WR')
+    UNION ALL
+    SELECT person_country_id AS region_id, * FROM results
+    WHERE regional_mean_record <> '' AND regional_mean_record <> 'PR';
+"""
+
+DROP_RECORD_HISTORIES = """
+    DROP TABLE IF EXISTS record_history_single;
+    DROP TABLE IF EXISTS record_history_mean;
+"""
+
+
+# Each table the API reads is stored clustered by the key it is most often looked up by, so that the rows for one key
+# sit together in a few row groups and DuckDB's min/max statistics let it skip all the others. Rankings are paged
+# through in rank order, with persons ranked equally ordered by id, the same tie-break as the API's pagination cursor.
+# Lookups by a second key get an ART index instead. Replacing a table drops its indexes, so they are created after.
+_CLUSTER_TABLE = """
+    CREATE OR REPLACE TABLE {table_name} AS
+    SELECT * FROM {table_name}
+    ORDER BY {order_by};
+"""
+
+_CREATE_INDEX = """
+    CREATE INDEX {table_name}_{column}_idx ON {table_name} ({column});
+"""
+
+_CLUSTERED_BY = {
+    "results": "person_id, startdate",
+    "rankings": "world_rank NULLS LAST, person_id",
+    "mean_rankings": "world_rank NULLS LAST, person_id",
+    "record_history_single": "region_id, startdate",
+    "record_history_mean": "region_id, startdate",
+    "competitions": "id",
+    "persons": "wca_id",
+}
+
+_INDEXED_BY = {
+    "results": "competition_id",
+    "rankings": "person_id",
+    "mean_rankings": "person_id",
+}
+
+# Rankings are also paged through by continent and by country, which the world rank order scatters over every row
+# group. Each gets a copy of the rankings clustered by the region and its rank, so that a regional page reads only the
+# row groups holding its region's ranks. The copies are built again from the clustered tables by every run.
+_COPY_TABLE = """
+    CREATE OR REPLACE TABLE {copy_name} AS
+    SELECT * FROM {table_name}
+    ORDER BY {order_by};
+"""
+
+_REGIONAL_COPIES = {
+    "rankings_by_continent": ("rankings", "continent_id, continent_rank NULLS LAST, person_id"),
+    "rankings_by_country": ("rankings", "person_country_id, country_rank NULLS LAST, person_id"),
+    "mean_rankings_by_continent": ("mean_rankings", "continent_id, continent_rank NULLS LAST, person_id"),
+    "mean_rankings_by_country": ("mean_rankings", "person_country_id, country_rank NULLS LAST, person_id"),
+}
+
+CLUSTER_TABLES = (
+    "".join(
+        _CLUSTER_TABLE.format(table_name=table_name, order_by=order_by)
+        for table_name, order_by in _CLUSTERED_BY.items()
+    )
+    + "".join(
+        _COPY_TABLE.format(copy_name=copy_name, table_name=table_name, order_by=order_by)
+        for copy_name, (table_name, order_by) in _REGIONAL_COPIES.items()
+    )
+    + "".join(_CREATE_INDEX.format(table_name=table_name, column=column) for table_name, column in _INDEXED_BY.items())
+)
+
+DROP_REGIONAL_COPIES = "".join(f"DROP TABLE IF EXISTS {copy_name};" for copy_name in _REGIONAL_COPIES)
+
+
+# Bulk exports of the tables clients download whole, written for each build in the order the tables are clustered in.
+_EXPORT_TABLE = """
+    COPY (SELECT * FROM {table_name} ORDER BY {order_by}) TO '{path}' ({options});
+"""
+
+EXPORTED_TABLES = ("rankings", "mean_rankings", "results")
+
+# File extension of each export format, and the COPY options that write it.
+EXPORT_FORMATS = {
+    "parquet": "FORMAT parquet, COMPRESSION zstd",
+    "csv.gz": "FORMAT csv, HEADER, COMPRESSION gzip",
+}
+
+
+def export_table(table_name: str, extension: str, path: str) -> str:
+    return _EXPORT_TABLE.format(
+        table_name=table_name,
+        order_by=_CLUSTERED_BY[table_name],
+        path=path.replace("'", "''"),
+        options=EXPORT_FORMATS[extension],
+    )